@@ -0,0 +1,200 @@
+import json
+import os
+import random
+from typing import List, Sequence
+
+WORDS = ["apple", "bean", "butter", "carrot", "cheese", "chili", "cinnamon", "cream", "cumin", "egg",
+         "fennel", "flour", "garlic", "ginger", "honey", "leek", "lemon", "lentil", "milk", "mushroom",
+         "noodle", "oat", "olive", "onion", "orange", "paprika", "pea", "pepper", "potato", "rice",
+         "sage", "spinach", "sugar", "thyme", "tomato", "walnut", "yogurt", "zucchini"]
+DISHES = ["soup", "stew", "cake", "salad", "pie", "curry", "bread", "risotto", "tart", "casserole"]
+# roughly in order of popularity, tags are drawn with weights 1, 1/2, 1/3, ...
+TAGS = ["vegetarian", "dinner", "quick", "dessert", "vegan", "lunch", "baking", "breakfast", "spicy",
+        "summer", "winter", "party", "side", "snack", "sauce", "soup", "festive", "healthy", "christmas",
+        "picnic", "brunch", "gluten-free", "one-pot", "slow-cooker", "barbecue", "autumn", "spring"]
+TAG_WEIGHTS = [1 / (rank + 1) for rank in range(len(TAGS))]
+UNITS = ["g", "kg", "ml", "l", "tsp", "tbsp", "cups", "pinch"]
+VERBS = ["Mix", "Stir", "Chop", "Bake", "Simmer", "Whisk", "Fold", "Season", "Fry", "Rest"]
+
+
+def recipe_name(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {rng.choice(DISHES).title()} {i}"
+
+
+def tags(rng: random.Random) -> List[str]:
+    return list(dict.fromkeys(rng.choices(TAGS, TAG_WEIGHTS, k=rng.randint(1, 4))))
+
+
+def ingredient(rng: random.Random) -> (str, float, str):
+    """
+    (ingredient, amount, unit), amount and unit may be None
+    """
+    name = rng.choice(WORDS)
+    kind = rng.random()
+    if kind < 0.1:
+        return name, None, None
+    if kind < 0.25:
+        return name, rng.randint(1, 6), None
+    if kind < 0.35:
+        return f"{name} {rng.choice(WORDS)}", rng.randint(1, 4), rng.choice(UNITS)
+    return name, rng.randint(1, 500), rng.choice(UNITS)
+
+
+def ingredient_line(rng: random.Random) -> str:
+    name, amount, unit = ingredient(rng)
+    if amount is None:
+        return f"- {name}"
+    if unit is None:
+        return f"- {amount} {name}"
+    if " " in name:
+        return f'- {amount} {unit} "{name}"'
+    return f"- {amount} {unit} {name}"
+
+
+def instruction_line(rng: random.Random) -> str:
+    words = [rng.choice(VERBS)] + [rng.choice(WORDS) for _ in range(rng.randint(3, 12))]
+    if rng.random() < 0.3:
+        words.insert(2, f"{{{rng.randint(1, 30)}}}")
+    return " ".join(words) + "."
+
+
+def recipe_text(rng: random.Random, name: str, related: List[str]) -> str:
+    lines = [f"name {name}"]
+    if rng.random() < 0.3:
+        lines.append(f"serves {rng.randint(1, 12)} portions {rng.choice(['1', '0.5'])}")
+    else:
+        lines.append(f"serves {rng.randint(1, 12)}")
+    lines.append(f"desc {instruction_line(rng)}")
+    lines.append(f"  {instruction_line(rng)}")
+    lines.append(f"tags {', '.join(tags(rng))}")
+    if related:
+        lines.append(f"related {', '.join(related)}")
+    if rng.random() < 0.05:
+        lines.append("hide")
+    lines.append("")
+
+    for section in range(rng.randint(1, 3)):
+        lines.append(f"# Part {section + 1}")
+        for step in range(rng.randint(1, 4)):
+            if step > 0 and rng.random() < 0.3:
+                # either spelled out or as a hidden ingredient, both consume the previous step's yield
+                marker = "=" if rng.random() < 0.7 else "@"
+                lines.append(f"{marker} part {section + 1} step {step}")
+            elif section > 0 and step == 0 and rng.random() < 0.2:
+                lines.append("@nodep")
+            lines.extend(ingredient_line(rng) for _ in range(rng.randint(0, 5)))
+            if step + 1 < 4:
+                # only yielded if the next step exists and uses it, see below
+                lines.append(f"-> part {section + 1} step {step + 1}")
+            lines.extend(instruction_line(rng) for _ in range(rng.randint(1, 3)))
+            lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def fix_yields(text: str) -> str:
+    """
+    Drop yields that no later step consumes, the parser rejects them
+    """
+    lines = text.split("\n")
+    used = {line[2:] for line in lines if line.startswith("= ") or line.startswith("@ ")}
+    return "\n".join(line for line in lines if not (line.startswith("-> ") and line[3:] not in used))
+
+
+def recipe_yaml(rng: random.Random, name: str, related: List[str]) -> str:
+    """
+    The same kind of recipe in the YAML schema (version 1), with one dependency chain through its cooking steps
+    """
+    lines = [f"name: {json.dumps(name)}",
+             f"serves: {rng.randint(1, 12)}",
+             f"descr: {json.dumps(instruction_line(rng))}",
+             f"tags: {json.dumps(', '.join(tags(rng)))}",
+             f"related: {json.dumps(related)}"]
+    if rng.random() < 0.05:
+        lines.append("hide_from_all: true")
+
+    for section in ["prep", "cooking"]:
+        lines.append(f"{section}:")
+        count = rng.randint(1, 4)
+        for step in range(count):
+            ingredients = [ingredient(rng) for _ in range(rng.randint(0, 5))]
+            lines.append(f"  - instructions: {json.dumps(' '.join(instruction_line(rng) for _ in range(rng.randint(1, 3))))}")
+            if ingredients:
+                lines.append("    ingredients:")
+                for ingr_name, amount, unit in ingredients:
+                    lines.append(f"      - ingredient: {json.dumps(ingr_name)}")
+                    if amount is not None:
+                        lines.append(f"        amount: {amount}")
+                    if unit is not None:
+                        lines.append(f"        unit: {json.dumps(unit)}")
+            if section == "cooking" and step > 0:
+                lines.append(f"    internal_ingredients: [{json.dumps(f'cooking step {step}')}]")
+            if section == "cooking" and step + 1 < count:
+                lines.append(f"    yields: {json.dumps(f'cooking step {step + 1}')}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(folder: str, count: int, seed: int = 0, langs: Sequence[str] = ("en", "de"),
+                    translated: float = 0.3, yaml: float = 0.0) -> List[str]:
+    """
+    Write `count` synthetic recipes to the folder. Every recipe exists in the first language, each further
+    language has a translation of about a `translated` fraction of them, and about a `yaml` fraction of the
+    recipes are written in the YAML schema instead of .recipe files. The same arguments always produce the
+    same files. Returns the written paths.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    names = [recipe_name(rng, i) for i in range(count)]
+    paths = []
+    for name in names:
+        related = rng.sample(names, rng.randint(0, 2))
+        recipe_langs = [langs[0]] + [lang for lang in langs[1:] if rng.random() < translated]
+        use_yaml = rng.random() < yaml
+        for lang in recipe_langs:
+            if use_yaml:
+                path = os.path.join(folder, f"{name}.{lang}.yml")
+                content = recipe_yaml(rng, name, related)
+            else:
+                path = os.path.join(folder, f"{name}.{lang}.recipe")
+                content = fix_yields(recipe_text(rng, name, related))
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            paths.append(path)
+    return paths
+
+
+def configure_app(folder: str, **config):
+    """
+    Point the cookbook app at a corpus through FLASK_ environment variables. Call this before importing
+    cookbook.main, which reads its configuration on import.
+    """
+    os.environ["FLASK_COOKBOOK_LOCATION"] = folder
+    os.environ.setdefault("FLASK_BASE_URL", "http://localhost")
+    for key, value in config.items():
+        os.environ[f"FLASK_{key}"] = str(value)
+
+
+def generate_queries(count: int, seed: int = 0) -> List[str]:
+    """
+    Search queries over the generator's vocabulary: tags, ingredients, free words and combinations of them
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        terms = []
+        for _ in range(rng.randint(1, 3)):
+            kind = rng.random()
+            if kind < 0.3:
+                terms.append(f"tag:{rng.choices(TAGS, TAG_WEIGHTS)[0]}")
+            elif kind < 0.55:
+                terms.append(f"ingr:{rng.choice(WORDS)}")
+            elif kind < 0.65:
+                terms.append(f"ingr:'{rng.choice(WORDS)} {rng.choice(WORDS)}'")
+            elif kind < 0.9:
+                terms.append(rng.choice(WORDS + DISHES))
+            else:
+                # a typo, found by fuzzy matching
+                word = rng.choice(WORDS)
+                position = rng.randrange(len(word))
+                terms.append(word[:position] + word[position + 1:])
+        queries.append(" ".join(terms))
+    return queries
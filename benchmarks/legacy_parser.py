@@ -0,0 +1,156 @@
+"""
+The line-by-line .recipe parser as it was before RecipeLines, kept to compare against the current one.
+It builds the same classes as cookbook.cookbook.recipev2.
+"""
+import shlex
+from typing import List, TextIO
+
+from cookbook.cookbook.errors import LoadException
+from cookbook.cookbook.recipev2 import (RecipeMeta, Ingredient, RecipeStep, RecipeSection, RecipeV2, InstrPart,
+                                        normalize_id, split_instr)
+
+
+def read_multiline(file: TextIO) -> (str, str):
+    acc = ""
+    while True:
+        line = file.readline()
+        if line.startswith("  "):
+            acc += line[1:]
+        else:
+            return acc, line
+
+
+def parse_meta(file: TextIO, id, lang, raw_id) -> RecipeMeta:
+    metadata = RecipeMeta()
+    metadata.id = id
+    metadata.lang = lang
+    metadata.raw_id = raw_id
+
+    line = file.readline()
+
+    while line.strip() != "":
+        if line.startswith("name "):
+            metadata.set_once('name', line[5:].strip())
+        elif line.startswith("serves "):
+            parts = shlex.split(line)
+            metadata.set_once('serves', int(parts[1]))
+            if len(parts) > 2:
+                metadata.set_once('servings_unit', parts[2])
+            if len(parts) > 3:
+                if "." in parts[3]:
+                    metadata.set_once('servings_increment', float(parts[3]))
+                else:
+                    metadata.set_once('servings_increment', int(parts[3]))
+        elif line.startswith("desc "):
+            beginning = line[5:].strip()
+            acc, rem = read_multiline(file)
+            line = rem
+            metadata.set_once('desc', f'{beginning} {acc}')
+            continue
+        elif line.startswith("note "):
+            beginning = line[5:].strip()
+            acc, rem = read_multiline(file)
+            line = rem
+            metadata.set_once('note', f'{beginning} {acc}')
+            continue
+        elif line.startswith("tags "):
+            tags = map(lambda tag: tag.strip().lower(), line[5:].split(","))
+            metadata.tags.extend(tags)
+        elif line.startswith("attrib "):
+            metadata.set_once('attribution', line[6:].strip())
+        elif line.startswith("related "):
+            parts = map(lambda rel: normalize_id(rel), line[7:].split(","))
+            metadata.related.extend(parts)
+        elif line.startswith("hide"):
+            metadata.set_once('hide_from_all', True)
+        elif line.startswith("version "):
+            metadata.set_once('schema_version', int(line[7:].strip()))
+
+        line = file.readline()
+
+    metadata.validate()
+    return metadata
+
+
+def parse_ingredient(line: str, serves: float) -> Ingredient:
+    parts = shlex.split(line)
+    if not parts:
+        raise LoadException(f"Can't parse ingredient '{line}': missing information")
+
+    try:
+        if len(parts) == 1:
+            return Ingredient(serves, parts[0])
+        elif len(parts) == 2:
+            return Ingredient(serves, parts[1], float(parts[0]))
+        else:
+            return Ingredient(serves, ' '.join(parts[2:]), float(parts[0]), parts[1])
+    except ValueError:
+        raise LoadException(f"Can't parse amount of ingredient '{line}' (lexed as {parts})")
+
+
+def parse_step(file: TextIO, serves: float) -> RecipeStep:
+    ingredients: List[Ingredient] = []
+    internal_ingredients: List[str] = []
+    hidden_ingredients: List[str] = []
+    instructions: List[InstrPart] = []
+    yields: List[str] = []
+    no_dep = False
+
+    line = file.readline()
+    while line.strip() != "":
+        if line.startswith("- "):
+            ingredients.append(parse_ingredient(line[2:], serves))
+        elif line.startswith("= "):
+            internal_ingredients.append(line[2:].strip())
+        elif line.startswith("@nodep"):
+            no_dep = True
+        elif line.startswith("@ "):
+            hidden_ingredients.append(line[2:].strip())
+        elif line.startswith("-> "):
+            yields.append(line[3:].lower().strip())
+        else:
+            instructions += split_instr(line.strip(), serves)
+        line = file.readline()
+
+    return RecipeStep(serves, instructions, ingredients, internal_ingredients, hidden_ingredients, yields, no_dep)
+
+
+def parse(file: TextIO, id, lang, raw_id) -> RecipeV2:
+    meta = parse_meta(file, id, lang, raw_id)
+
+    sections = []
+
+    current_section_steps = []
+    current_section_heading = None
+
+    pos = file.tell()
+    line = file.readline()
+    while line:
+        while line.strip() == "":
+            pos = file.tell()
+            line = file.readline()
+
+        if line.startswith("# "):
+            if current_section_heading:
+                sections.append(RecipeSection(current_section_steps, current_section_heading))
+
+            current_section_heading = line[2:].strip()
+            current_section_steps = []
+        else:
+            file.seek(pos)
+            try:
+                current_section_steps.append(parse_step(file, meta.serves))
+            except LoadException as e:
+                e.add_note(f'In step #{len(current_section_steps) + 1} of section #{len(sections) + 1} ({current_section_heading if current_section_heading else "<untitled>"})')
+                raise e
+
+        pos = file.tell()
+        line = file.readline()
+
+    if current_section_steps:
+        sections.append(RecipeSection(current_section_steps, current_section_heading))
+
+    recipe = RecipeV2(meta, sections)
+    recipe.build_dep_graph()
+
+    return recipe
@@ -0,0 +1,58 @@
+"""
+Report how much memory the loaded recipes take per 1,000 recipes of a synthetic corpus:
+
+    python -m benchmarks.memory --recipes 2000
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import tempfile
+import tracemalloc
+
+from .corpus import generate_corpus, configure_app
+
+
+def allocated_by(load) -> int:
+    """
+    Bytes still allocated by the result of `load` once it returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory")
+    parser.add_argument("--recipes", type=int, default=1000, help="number of recipes to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as cache:
+        paths = generate_corpus(folder, args.recipes, args.seed)
+
+        configure_app(folder)
+        with contextlib.redirect_stdout(io.StringIO()):
+            from cookbook.cookbook.cookbook import Cookbook
+            from cookbook.cookbook.snapshot import load_shared, read_snapshot
+
+        recipes = allocated_by(lambda: [Cookbook.load_file(path) for path in paths])
+        book = allocated_by(lambda: Cookbook.load_folder(folder))
+        snapshot_path = os.path.join(cache, "book.snap")
+        load_shared(snapshot_path, folder)
+        snapshot = allocated_by(lambda: read_snapshot(snapshot_path, folder))
+
+    print(f"{len(paths)} files")
+    print(f"recipes:             {recipes / len(paths) * 1000 / 2**20:8.2f} MiB per 1,000 recipes")
+    print(f"cookbook (indexed):  {book / len(paths) * 1000 / 2**20:8.2f} MiB per 1,000 recipes")
+    print(f"cookbook (snapshot): {snapshot / len(paths) * 1000 / 2**20:8.2f} MiB per 1,000 recipes")
+
+
+if __name__ == "__main__":
+    main()
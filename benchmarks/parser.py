@@ -0,0 +1,90 @@
+"""
+Compare the .recipe parser against the previous line-by-line parser on a synthetic corpus:
+
+    python -m benchmarks.parser --recipes 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from .corpus import generate_corpus, configure_app
+
+
+def describe(recipe) -> tuple:
+    """
+    Everything the parser produces, as plain values that can be compared between parsers
+    """
+    def fields(obj):
+        return {name: getattr(obj, name) for name in obj.__slots__}
+
+    def ingredients(ingrs):
+        return [fields(ingr) for ingr in ingrs]
+
+    steps = [step for section in recipe.sections for step in section.steps]
+    index = {id(step): i for i, step in enumerate(steps)}
+    meta = fields(recipe.metadata)
+    meta.pop('_set_attrs')
+    return (meta,
+            [(section.heading, len(section.steps)) for section in recipe.sections],
+            [(step.serves, step.instructions, ingredients(step.ingredients), step.internal_ingredients,
+              step.hidden_ingredients, step.yields, step.no_dep,
+              [index[id(s)] for s in step.upstream], [index[id(s)] for s in step.downstream]) for step in steps],
+            [index[id(step)] for step in recipe.root_steps],
+            ingredients(recipe.total_ingredients), recipe.ingr_bag, recipe.word_bag)
+
+
+def file_ids(path: str) -> (str, str, str):
+    stem, _ = os.path.splitext(os.path.basename(path))
+    raw_id, lang = os.path.splitext(stem)
+    return raw_id.strip().lower().replace(' ', '-'), lang[1:], raw_id
+
+
+def time_parser(parse, paths, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            with open(path, encoding='utf-8') as file:
+                parse(file, *file_ids(path))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.parser")
+    parser.add_argument("--recipes", type=int, default=1000, help="number of recipes to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per parser, the best one counts")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = generate_corpus(folder, args.recipes, args.seed)
+
+        configure_app(folder)
+        with contextlib.redirect_stdout(io.StringIO()):
+            from cookbook.cookbook.recipev2 import RecipeV2
+            from . import legacy_parser
+
+        for path in paths:
+            with open(path, encoding='utf-8') as file:
+                current = describe(RecipeV2.parse(file, *file_ids(path)))
+            with open(path, encoding='utf-8') as file:
+                legacy = describe(legacy_parser.parse(file, *file_ids(path)))
+            if current != legacy:
+                raise AssertionError(f"Parsers disagree on {path}")
+
+        legacy_time = time_parser(legacy_parser.parse, paths, args.repeat)
+        current_time = time_parser(RecipeV2.parse, paths, args.repeat)
+
+    print(f"{len(paths)} files")
+    print(f"legacy parser:  {legacy_time * 1000:8.1f} ms ({legacy_time / len(paths) * 1e6:6.1f} us/file)")
+    print(f"current parser: {current_time * 1000:8.1f} ms ({current_time / len(paths) * 1e6:6.1f} us/file)")
+    print(f"speedup:        {legacy_time / current_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
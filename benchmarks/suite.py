@@ -0,0 +1,164 @@
+"""
+Time loading, validating, searching and rendering a synthetic cookbook, and print the results as JSON:
+
+    python -m benchmarks.suite --recipes 5000 --output before.json
+
+Runs with the same arguments use the same corpus and queries, so their results can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote
+
+from .corpus import generate_corpus, generate_queries, configure_app
+
+
+def measure(run: Callable[[], Optional[int]], repeat: int) -> Dict[str, float]:
+    """
+    Time `run` `repeat` times. `run` may return the number of operations it did, for a time per operation.
+    """
+    times = []
+    operations = 1
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operations = run() or 1
+        times.append(time.perf_counter() - start)
+    return {
+        "runs": repeat,
+        "operations": operations,
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+        "per_operation": min(times) / operations,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(folder: str, args) -> Dict[str, Dict[str, float]]:
+    # page and search caches are off so that every request renders
+    configure_app(folder, PAGE_CACHE_SIZE=0, SEARCH_CACHE_SIZE=0)
+    from cookbook.cookbook.cookbook import Cookbook
+    from cookbook import searchparser
+    from cookbook.main import create_app
+    app = create_app()
+    from cookbook.main import book
+
+    lang = args.langs[0]
+    queries = generate_queries(args.queries, args.seed)
+    parsed = [searchparser.Parser(query).parse() for query in queries]
+    recipes = book.by_language[lang]
+    client = app.test_client()
+    recipe_ids = sorted(book.by_id)[:args.pages]
+
+    def load():
+        Cookbook.load_folder(folder)
+
+    def validate():
+        book.validate_tags()
+
+    def parse_queries():
+        for query in queries:
+            searchparser.Parser(query).parse()
+        return len(queries)
+
+    def passes():
+        for query in parsed:
+            for recipe in recipes:
+                query.passes(recipe)
+        return len(parsed) * len(recipes)
+
+    def matches():
+        for query in parsed:
+            query.matches(book, lang)
+        return len(parsed)
+
+    def get_all(urls: List[str]) -> Callable[[], int]:
+        def run():
+            for url in urls:
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise AssertionError(f"{url}: status {response.status_code}")
+            return len(urls)
+        return run
+
+    results = {
+        "load_folder": measure(load, args.repeat),
+        "validate_tags": measure(validate, args.repeat),
+        "parse_query": measure(parse_queries, args.repeat),
+        "query_passes": measure(passes, args.repeat),
+        "query_matches": measure(matches, args.repeat),
+        "render_listing": measure(get_all([f"/{lang}/all"]), args.repeat),
+        "render_search": measure(get_all([f"/{lang}/search?query={quote(query)}" for query in queries[:args.pages]]),
+                                 args.repeat),
+        "render_recipe": measure(get_all([f"/{lang}/recipe/{quote(id)}" for id in recipe_ids]), args.repeat),
+    }
+    results["query_passes"]["recipes"] = len(recipes)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite")
+    parser.add_argument("--recipes", type=int, default=1000, help="number of recipes to generate (100 to 50000)")
+    parser.add_argument("--langs", default="en,de,fr", help="comma separated languages, all recipes exist in the first")
+    parser.add_argument("--yaml", type=float, default=0.1, help="fraction of recipes in the YAML schema")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="number of search queries")
+    parser.add_argument("--pages", type=int, default=50, help="number of search and recipe pages to render")
+    parser.add_argument("--corpus", help="generate the corpus in this folder and keep it, instead of a temporary one")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    args.langs = args.langs.split(",")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.corpus or tmp
+        start = time.perf_counter()
+        paths = generate_corpus(folder, args.recipes, args.seed, args.langs, yaml=args.yaml)
+        generated = time.perf_counter() - start
+
+        with contextlib.redirect_stdout(io.StringIO()):  # keep the app's load messages out of the JSON
+            results = run_suite(folder, args)
+
+    report = {
+        "meta": {
+            "recipes": args.recipes,
+            "files": len(paths),
+            "langs": args.langs,
+            "yaml": args.yaml,
+            "seed": args.seed,
+            "queries": args.queries,
+            "pages": args.pages,
+            "corpus_seconds": generated,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,7 @@
-from .main import app
\ No newline at end of file
+def __getattr__(name):
+    # the application is created on first use rather than on import, see main.create_app
+    if name == "app":
+        from .main import create_app
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
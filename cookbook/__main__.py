@@ -1,17 +1,30 @@
+import argparse
 import os
 
-from .main import app
+from .main import create_app
 
 
 if __name__ == "__main__":
-    extra_dirs = ["templates", "static"]
-    extra_files = extra_dirs[:]
-    for extra_dir in extra_dirs:
-        for dirname, dirs, files in os.walk(extra_dir):
-            for filename in files:
-                filename = os.path.join(dirname, filename)
-                if os.path.isfile(filename):
-                    extra_files.append(filename)
+    parser = argparse.ArgumentParser(prog="python -m cookbook")
+    commands = parser.add_subparsers(dest="command")
+    export_parser = commands.add_parser("export", help="render the cookbook to a folder of static files")
+    export_parser.add_argument("dir", help="output folder, e.g. the document root of your web server")
+    export_parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of rendering processes")
+    export_parser.add_argument("--tags", type=int, default=4, help="number of most common tags per language to render search pages for")
+    args = parser.parse_args()
+    app = create_app()
 
-    app.run(extra_files=extra_files)
+    if args.command == "export":
+        from .export import export
+        export(args.dir, args.workers, args.tags)
+    else:
+        extra_dirs = ["templates", "static"]
+        extra_files = extra_dirs[:]
+        for extra_dir in extra_dirs:
+            for dirname, dirs, files in os.walk(extra_dir):
+                for filename in files:
+                    filename = os.path.join(dirname, filename)
+                    if os.path.isfile(filename):
+                        extra_files.append(filename)
 
+        app.run(extra_files=extra_files)
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Optional
+
+from . import compression
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe least-recently-used cache. Entries belong to one cookbook generation; once the
+    cookbook reports a different generation via `sync`, all entries are dropped.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = None
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sync(self, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                self._entries.clear()
+                self.generation = generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class CachedPage:
+    body: bytes
+    etag: str
+    mimetype: str
+    # compressed bodies by encoding, None where compressing did not make the page smaller
+    encoded: Dict[str, Optional[bytes]] = field(default_factory=dict)
+
+    @staticmethod
+    def from_body(body: bytes, mimetype: str) -> 'CachedPage':
+        return CachedPage(body, hashlib.sha256(body).hexdigest()[:32], mimetype)
+
+    def encode(self, encoding: str) -> Optional[bytes]:
+        """
+        The page in the encoding, compressed the first time a client asks for it. Pages are compressed
+        while the request waits, so with the fast settings rather than the smallest output.
+        """
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compression.encode(self.body, encoding, compression.FAST)
+        return self.encoded[encoding]
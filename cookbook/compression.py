@@ -0,0 +1,97 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, without it we only offer gzip
+    brotli = None
+
+# in order of preference when the client accepts several with the same quality
+ENCODINGS = ["br", "gzip"] if brotli else ["gzip"]
+
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".svg", ".json", ".txt", ".xml"}
+
+FILE_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+# brotli quality and gzip level per encoding: the smallest output for files compressed once (static assets,
+# exports), and a much faster setting for pages compressed while a request waits for them
+BEST = {"br": 11, "gzip": 9}
+FAST = {"br": 4, "gzip": 6}
+
+
+def encode(data: bytes, encoding: str, levels: Dict[str, int] = BEST) -> Optional[bytes]:
+    """
+    Compress the data with one of the supported encodings, or None if that does not make it smaller
+    """
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=levels["br"])
+    else:
+        compressed = gzip.compress(data, compresslevel=levels["gzip"], mtime=0)
+    return compressed if len(compressed) < len(data) else None
+
+
+def compress(data: bytes, levels: Dict[str, int] = BEST) -> Dict[str, bytes]:
+    """
+    Compress the data with every supported encoding, keeping only the encodings that make it smaller
+    """
+    result = {}
+    for encoding in ENCODINGS:
+        compressed = encode(data, encoding, levels)
+        if compressed is not None:
+            result[encoding] = compressed
+    return result
+
+
+def negotiate(accept_encodings, available) -> Optional[str]:
+    """
+    Pick the encoding to respond with from the client's Accept-Encoding header, or None for identity
+    """
+    return accept_encodings.best_match([encoding for encoding in ENCODINGS if encoding in available])
+
+
+def write_precompressed(path: str):
+    """
+    Write compressed copies of a file next to it (e.g. style.css.gz), for web servers that serve them directly
+    """
+    if os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+        return
+    with open(path, 'rb') as file:
+        data = file.read()
+    for encoding, compressed in compress(data).items():
+        with open(path + FILE_SUFFIXES[encoding], 'wb') as file:
+            file.write(compressed)
+
+
+@dataclass
+class StaticFile:
+    mimetype: str
+    etag: str
+    mtime: float
+    encoded: Dict[str, bytes]
+
+
+def precompress_folder(folder: str) -> Dict[str, StaticFile]:
+    """
+    Compress all compressible files in a folder once, keyed by their path relative to the folder
+    """
+    result = {}
+    for root, _, files in os.walk(folder):
+        for file in files:
+            path = os.path.join(root, file)
+            if os.path.splitext(file)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            encoded = compress(data)
+            encoded["identity"] = data
+            relpath = os.path.relpath(path, folder).replace(os.sep, "/")
+            result[relpath] = StaticFile(mimetypes.guess_type(file)[0] or "application/octet-stream",
+                                         hashlib.sha256(data).hexdigest()[:32],
+                                         os.stat(path).st_mtime,
+                                         encoded)
+    return result
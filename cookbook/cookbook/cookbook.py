@@ -1,20 +1,59 @@
+import bisect
 import os
-from typing import List, Dict, Set
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from typing import Callable, List, Dict, Set, Tuple, Iterable, Optional
 import os.path as ospath
-import difflib
 
 from .errors import LoadException
+from .fuzzy import FuzzyIndex
+from .prefix import PrefixIndex
+from .ranking import CountRanking
+from .recipecache import RecipeCache
 from .recipev1 import RecipeV1
 from .recipev2 import RecipeV2
 
 Recipe = RecipeV2
 
+EXTENSION_MAP = {
+    '.yml': RecipeV1,
+    '.yaml': RecipeV1,
+    '.recipe': RecipeV2,
+}
+
+# below this many files, starting worker processes costs more than it saves
+PARALLEL_LOAD_THRESHOLD = 64
+
+# number of files parsed by a worker process per task
+PARALLEL_CHUNK_SIZE = 16
+
+# the most completions returned for a prefix, see Cookbook.suggestions
+SUGGESTION_LIMIT = 10
+
+# translates the digits of bin() to bytes 0 and 1, see Cookbook.recipes_in
+BIT_FLAGS = bytes.maketrans(b'01', b'\x00\x01')
+
 
 def normalize_id(id: str):
     return id.lower().replace(' ', '-')
 
 
+def name_words(recipe: Recipe) -> Set[str]:
+    return {word.lower() for word in recipe.metadata.name.split()}
+
+
+def listing_order(recipe: Recipe):
+    """
+    Sort key for recipe listings: by name, with the id breaking ties so that the order is stable across requests
+    """
+    return recipe.metadata.name, recipe.metadata.id
+
+
 class RecipeTranslations:
+    __slots__ = ('translations',)
+
     def __init__(self):
         self.translations: Dict[str, Recipe] = {}
 
@@ -27,18 +66,343 @@ class RecipeTranslations:
 
 
 class Cookbook:
-    def __init__(self, folder):
+    def __init__(self, folder, workers: int = 0, cache: Optional[RecipeCache] = None):
         self.folder = folder
+        self.workers = workers
+        self.cache = cache
+        self.generation = 0
+        self.last_modified = time.time()
         self.by_id: Dict[str, RecipeTranslations] = {}
         self.by_language: Dict[str, List[Recipe]] = {}
-        self.by_lang_and_tag: Dict[str, Dict[str, List[Recipe]]] = {}
-        self.tagcount_by_language: Dict[str, Dict[str, int]] = {}
+        # every recipe of a language has a dense ordinal, and the recipes with a tag, ingredient, word etc.
+        # are kept as a bitset of their ordinals in an int. Ordinals of removed recipes are reused.
+        self.ordinal_by_language: Dict[str, Dict[Recipe, int]] = {}
+        self.recipe_by_ordinal: Dict[str, List[Optional[Recipe]]] = {}
+        self.free_ordinals: Dict[str, List[int]] = {}
+        self.all_bits_by_language: Dict[str, int] = {}
+        self.tag_bits_by_language: Dict[str, Dict[str, int]] = {}
+        self.ingr_bits_by_language: Dict[str, Dict[str, int]] = {}
+        self.word_bits_by_language: Dict[str, Dict[str, int]] = {}
+        self.name_word_bits_by_language: Dict[str, Dict[str, int]] = {}
+        self.serves_bits_by_language: Dict[str, Dict[float, int]] = {}
+        self.vocabulary_by_language: Dict[str, FuzzyIndex] = {}
+        self.tag_index_by_language: Dict[str, FuzzyIndex] = {}
+        self.tag_ranking_by_language: Dict[str, CountRanking] = {}
+        self.id_index = FuzzyIndex()
+
+        # precomputed views for the listing pages, see build_listings()
+        self.sorted_by_language: Dict[str, List[Recipe]] = {}
+        self.visible_by_language: Dict[str, List[Recipe]] = {}
+        self.suggestions_by_language: Dict[str, PrefixIndex] = {}
+
+        # state of the recipe files as of the last (re)load, see refresh()
+        self.files: Dict[str, Tuple[int, int]] = {}
+        self.recipe_by_path: Dict[str, Recipe] = {}
+        self.images: Set[str] = set()
+
+    def changed(self):
+        """
+        Record a change to the cookbook's contents, invalidating anything cached for the previous generation
+        """
+        self.generation += 1
+        self.last_modified = time.time()
+
+    def add_recipe(self, recipe: Recipe):
+        id = recipe.metadata.id
+        lang = recipe.metadata.lang
+        self.changed()
+
+        recipe.image = self.resolve_image(recipe)
+
+        if id not in self.by_id:
+            self.by_id[id] = RecipeTranslations()
+            self.id_index.add(id)
+        self.by_id[id].translations[lang] = recipe
+
+        if lang not in self.by_language:
+            self.by_language[lang] = []
+            self.ordinal_by_language[lang] = {}
+            self.recipe_by_ordinal[lang] = []
+            self.free_ordinals[lang] = []
+            self.all_bits_by_language[lang] = 0
+            self.tag_bits_by_language[lang] = {}
+            self.ingr_bits_by_language[lang] = {}
+            self.word_bits_by_language[lang] = {}
+            self.name_word_bits_by_language[lang] = {}
+            self.serves_bits_by_language[lang] = {}
+            self.vocabulary_by_language[lang] = FuzzyIndex()
+            self.tag_index_by_language[lang] = FuzzyIndex()
+            self.tag_ranking_by_language[lang] = CountRanking()
+        self.by_language[lang].append(recipe)
+
+        if self.free_ordinals[lang]:
+            ordinal = self.free_ordinals[lang].pop()
+            self.recipe_by_ordinal[lang][ordinal] = recipe
+        else:
+            ordinal = len(self.recipe_by_ordinal[lang])
+            self.recipe_by_ordinal[lang].append(recipe)
+        self.ordinal_by_language[lang][recipe] = ordinal
+        bit = 1 << ordinal
+        self.all_bits_by_language[lang] |= bit
+
+        tag_bits = self.tag_bits_by_language[lang]
+        for tag in recipe.metadata.tags:
+            if tag not in tag_bits:
+                tag_bits[tag] = 0
+                self.tag_index_by_language[lang].add(tag)
+            if not tag_bits[tag] & bit:
+                self.tag_ranking_by_language[lang].increment(tag)
+            tag_bits[tag] |= bit
+            self.vocabulary_by_language[lang].add(tag)
+
+        ingr_bits = self.ingr_bits_by_language[lang]
+        for ingr in recipe.ingr_bag:
+            ingr_bits[ingr] = ingr_bits.get(ingr, 0) | bit
+            self.vocabulary_by_language[lang].add(ingr)
+
+        word_bits = self.word_bits_by_language[lang]
+        for word in recipe.word_bag:
+            word_bits[word] = word_bits.get(word, 0) | bit
+            self.vocabulary_by_language[lang].add(word)
+
+        name_word_bits = self.name_word_bits_by_language[lang]
+        for word in name_words(recipe):
+            name_word_bits[word] = name_word_bits.get(word, 0) | bit
+
+        serves_bits = self.serves_bits_by_language[lang]
+        serves_bits[recipe.metadata.serves] = serves_bits.get(recipe.metadata.serves, 0) | bit
+
+        if lang in self.sorted_by_language:
+            bisect.insort(self.sorted_by_language[lang], recipe, key=listing_order)
+            if not recipe.metadata.hide_from_all:
+                bisect.insort(self.visible_by_language[lang], recipe, key=listing_order)
+        self.suggestions_by_language.pop(lang, None)
+
+    def remove_recipe(self, recipe: Recipe):
+        id = recipe.metadata.id
+        lang = recipe.metadata.lang
+        self.changed()
+
+        self.by_language[lang].remove(recipe)
+
+        if lang in self.sorted_by_language:
+            Cookbook._remove_sorted(self.sorted_by_language[lang], recipe)
+            if not recipe.metadata.hide_from_all:
+                Cookbook._remove_sorted(self.visible_by_language[lang], recipe)
+        self.suggestions_by_language.pop(lang, None)
+
+        if self.by_id[id].translations.get(lang) is recipe:
+            del self.by_id[id].translations[lang]
+            # another file may define the same recipe and language, which add_recipe let this one shadow
+            for other in self.by_language[lang]:
+                if other.metadata.id == id:
+                    self.by_id[id].translations[lang] = other
+            if not self.by_id[id].translations:
+                del self.by_id[id]
+                self.id_index.remove(id)
+
+        ordinal = self.ordinal_by_language[lang].pop(recipe)
+        self.recipe_by_ordinal[lang][ordinal] = None
+        self.free_ordinals[lang].append(ordinal)
+        mask = ~(1 << ordinal)
+        self.all_bits_by_language[lang] &= mask
+
+        tag_bits = self.tag_bits_by_language[lang]
+        for tag in set(recipe.metadata.tags):
+            self.tag_ranking_by_language[lang].decrement(tag)
+            if Cookbook._clear_bits(tag_bits, tag, mask):
+                self.tag_index_by_language[lang].remove(tag)
+
+        ingr_bits = self.ingr_bits_by_language[lang]
+        for ingr in recipe.ingr_bag:
+            Cookbook._clear_bits(ingr_bits, ingr, mask)
+
+        word_bits = self.word_bits_by_language[lang]
+        for word in recipe.word_bag:
+            Cookbook._clear_bits(word_bits, word, mask)
+
+        for word in name_words(recipe):
+            Cookbook._clear_bits(self.name_word_bits_by_language[lang], word, mask)
+
+        Cookbook._clear_bits(self.serves_bits_by_language[lang], recipe.metadata.serves, mask)
+
+        for term in set(recipe.metadata.tags) | recipe.ingr_bag | recipe.word_bag:
+            if term not in tag_bits and term not in ingr_bits and term not in word_bits:
+                self.vocabulary_by_language[lang].remove(term)
+
+        if not self.by_language[lang]:
+            del self.by_language[lang]
+            del self.ordinal_by_language[lang]
+            del self.recipe_by_ordinal[lang]
+            del self.free_ordinals[lang]
+            del self.all_bits_by_language[lang]
+            del self.tag_bits_by_language[lang]
+            del self.ingr_bits_by_language[lang]
+            del self.word_bits_by_language[lang]
+            del self.name_word_bits_by_language[lang]
+            del self.serves_bits_by_language[lang]
+            del self.vocabulary_by_language[lang]
+            del self.tag_index_by_language[lang]
+            del self.tag_ranking_by_language[lang]
+            self.sorted_by_language.pop(lang, None)
+            self.visible_by_language.pop(lang, None)
+
+    @staticmethod
+    def _clear_bits(postings: dict, key, mask: int) -> bool:
+        """
+        Clear the bits outside the mask from the key's bitset, dropping the key once no bits are left.
+        Returns whether it was dropped.
+        """
+        bits = postings[key] & mask
+        if bits:
+            postings[key] = bits
+            return False
+        del postings[key]
+        return True
+
+    @staticmethod
+    def _remove_sorted(recipes: List[Recipe], recipe: Recipe):
+        i = bisect.bisect_left(recipes, listing_order(recipe), key=listing_order)
+        while recipes[i] is not recipe:  # duplicate files may produce recipes that compare equal
+            i += 1
+        del recipes[i]
+
+    def build_listings(self, langs: Optional[Iterable[str]] = None):
+        for lang in langs if langs is not None else self.by_language.keys():
+            self.sorted_by_language[lang] = sorted(self.by_language[lang], key=listing_order)
+            self.visible_by_language[lang] = [recipe for recipe in self.sorted_by_language[lang]
+                                              if not recipe.metadata.hide_from_all]
+            self.build_suggestions(lang)
+
+    def listing(self, lang: str, include_hidden: bool = False) -> List[Recipe]:
+        """
+        All recipes of the language in listing order, by default without the ones hidden from the all-recipes page
+        """
+        if lang not in self.by_language:
+            return []
+        if lang not in self.sorted_by_language:
+            self.build_listings([lang])
+        return self.sorted_by_language[lang] if include_hidden else self.visible_by_language[lang]
+
+    def in_listing_order(self, lang: str, recipes: Set[Recipe]) -> List[Recipe]:
+        ordered = self.listing(lang, include_hidden=True)
+        if len(recipes) * 16 < len(ordered):
+            return sorted(recipes, key=listing_order)  # cheaper than a pass over the whole language
+        return [recipe for recipe in ordered if recipe in recipes]
+
+    def bits_of(self, lang: str, recipes: Iterable[Recipe]) -> int:
+        """
+        The bitset of the recipes' ordinals, see recipes_in. Recipes of other languages are left out.
+        """
+        ordinals = self.ordinal_by_language.get(lang, {})
+        flags = bytearray((len(self.recipe_by_ordinal.get(lang, [])) + 7) // 8)
+        for recipe in recipes:
+            ordinal = ordinals.get(recipe)
+            if ordinal is not None:
+                flags[ordinal >> 3] |= 1 << (ordinal & 7)
+        return int.from_bytes(flags, 'little')
+
+    def recipes_in(self, lang: str, bits: int) -> List[Recipe]:
+        """
+        The recipes whose ordinals are set in the bitset, in the order of their ordinals
+        """
+        # one byte of 0 or 1 per ordinal, lowest first, so that compress picks the recipes without a Python loop
+        flags = bin(bits)[:1:-1].encode('ascii').translate(BIT_FLAGS)
+        return list(compress(self.recipe_by_ordinal.get(lang, []), flags))
+
+    def all_bits(self, lang: str) -> int:
+        return self.all_bits_by_language.get(lang, 0)
+
+    def tag_bits(self, lang: str, tag: str) -> int:
+        return self.tag_bits_by_language.get(lang, {}).get(tag.lower(), 0)
+
+    def ingredient_bits(self, lang: str, ingr: str) -> int:
+        return self.ingr_bits_by_language.get(lang, {}).get(ingr.lower(), 0)
+
+    def facets(self, lang: str, bits: int, n: int) -> List[Tuple[str, int]]:
+        """
+        The n tags most common among the recipes in the bitset, with their number of recipes there.
+        Tags of none or all of the recipes are left out, as they would not narrow the results down.
+        """
+        total = bits.bit_count()
+        counts = []
+        for tag in self.tag_ranking(lang):
+            count = (self.tag_bits_by_language[lang][tag] & bits).bit_count()
+            if 0 < count < total:
+                counts.append((tag, count))
+        counts.sort(key=lambda x: x[1], reverse=True)
+        return counts[:n]
+
+    def recipes_with_tag(self, lang: str, tag: str) -> Set[Recipe]:
+        return set(self.recipes_in(lang, self.tag_bits(lang, tag)))
+
+    def recipes_with_ingredient(self, lang: str, ingr: str) -> Set[Recipe]:
+        return set(self.recipes_in(lang, self.ingredient_bits(lang, ingr)))
+
+    def recipes_with_word(self, lang: str, word: str) -> Set[Recipe]:
+        return set(self.recipes_in(lang, self.word_bits_by_language.get(lang, {}).get(word.lower(), 0)))
+
+    def name_word_bits(self, lang: str, words: Iterable[str]) -> int:
+        """
+        Recipes whose name contains all of the words
+        """
+        postings = self.name_word_bits_by_language.get(lang, {})
+        bits = None
+        for word in words:
+            bits = postings.get(word.lower(), 0) if bits is None else bits & postings.get(word.lower(), 0)
+        return bits or 0
+
+    def recipes_with_name_words(self, lang: str, words: Iterable[str]) -> Set[Recipe]:
+        return set(self.recipes_in(lang, self.name_word_bits(lang, words)))
+
+    def serves_bits(self, lang: str, accepts: Callable[[float], bool]) -> int:
+        """
+        Recipes whose number of servings is accepted by the predicate, e.g. `lambda serves: serves > 4`
+        """
+        results = 0
+        for serves, bits in self.serves_bits_by_language.get(lang, {}).items():
+            if accepts(serves):
+                results |= bits
+        return results
+
+    def recipes_serving(self, lang: str, accepts: Callable[[float], bool]) -> Set[Recipe]:
+        return set(self.recipes_in(lang, self.serves_bits(lang, accepts)))
+
+    def bits_matching_approx(self, lang: str, term: str) -> int:
+        """
+        Find all recipes with a tag, ingredient or word similar to the search term. Equivalent to
+        checking has_tag_approx, has_ingredient_approx and has_word_approx on every recipe of the
+        language, but the term is resolved against the language's vocabulary only once.
+        """
+        if lang not in self.vocabulary_by_language:
+            return 0
+
+        term = term.lower()
+        matches = self.vocabulary_by_language[lang].close_matches(term, cutoff=0.8)
+        if term not in matches:
+            matches.append(term)
 
-    def validate_tags(self) -> List[LoadException]:
+        bits = 0
+        for postings in (self.tag_bits_by_language, self.ingr_bits_by_language, self.word_bits_by_language):
+            for match in matches:
+                bits |= postings[lang].get(match, 0)
+        return bits
+
+    def recipes_matching_approx(self, lang: str, term: str) -> Set[Recipe]:
+        return set(self.recipes_in(lang, self.bits_matching_approx(lang, term)))
+
+    def validate_tags(self, langs: Optional[Set[str]] = None, tags: Optional[Set[str]] = None) -> List[LoadException]:
+        """
+        Warn about tags that are close to other tags of the same language. With `tags`, only warnings
+        involving one of these tags are reported.
+        """
         tag_set: Dict[str, Set[str]] = {}
         warnings = []
 
         for lang, recipes in self.by_language.items():
+            if langs is not None and lang not in langs:
+                continue
+
             tag_set[lang] = set()
 
             for recipe in recipes:
@@ -46,11 +410,15 @@ class Cookbook:
                     tag_set[lang].add(tag)
 
             for tag in tag_set[lang]:
-                similar = difflib.get_close_matches(tag, tag_set[lang], cutoff=0.84)
+                # same result as difflib.get_close_matches(tag, tag_set[lang], cutoff=0.84), see FuzzyIndex
+                similar = self.tag_index_by_language[lang].close_matches(tag, cutoff=0.84, n=3)
                 similar.remove(tag)
+                if tags is not None and tag not in tags and not tags.intersection(similar):
+                    continue
                 if similar:
                     def recipe_list(other_tag):
-                        return ', '.join(map(lambda r: r.metadata.id, self.by_lang_and_tag[lang][other_tag]))
+                        recipes = self.recipes_in(lang, self.tag_bits_by_language[lang][other_tag])
+                        return ', '.join(map(lambda r: r.metadata.id, recipes))
 
                     def other_tag_list(tags):
                         return "\n".join(map(lambda t: f'    - {t} in {recipe_list(t)}', tags))
@@ -62,14 +430,23 @@ class Cookbook:
 
         return warnings
 
-    def validate_related(self) -> List[LoadException]:
+    def validate_related(self, langs: Optional[Set[str]] = None, ids: Optional[Set[str]] = None) -> List[LoadException]:
+        """
+        Warn about related recipes that do not exist or are not translated. With `ids`, only the
+        recipes with one of these ids or referencing one of them are checked.
+        """
         warnings = []
 
         for lang, recipes in self.by_language.items():
+            if langs is not None and lang not in langs:
+                continue
+
             for recipe in recipes:
+                if ids is not None and recipe.metadata.id not in ids and not ids.intersection(recipe.metadata.related):
+                    continue
                 for related in recipe.metadata.related:
                     if related not in self.by_id:
-                        similar = difflib.get_close_matches(related, self.by_id.keys(), cutoff=0.8)
+                        similar = self.id_index.close_matches(related, cutoff=0.8, n=3)
                         warning = f"Recipe {recipe.metadata.id} references unknown related recipe {related}."
                         if similar:
                             warning += "\n  Possibly misspelled, candidates: " + ', '.join(similar)
@@ -80,91 +457,233 @@ class Cookbook:
 
         return warnings
 
-    def image_path(self, recipe) -> str:
+    def scan_images(self) -> Set[str]:
+        try:
+            with os.scandir(os.path.join(self.folder, "images")) as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except (FileNotFoundError, NotADirectoryError):
+            return set()
+
+    def resolve_image(self, recipe) -> str:
         """
         Search for a matching image in the images/ subfolder of the recipe folder. Image name
         should be either the same as the recipe file name or in slug format (all lower case and spaces
         replaced with dashes)
         """
-        if os.path.exists(os.path.join(self.folder, "images", f"{recipe.metadata.raw_id}.png")):
-            return f"images/{recipe.metadata.raw_id}.png"
-        elif os.path.exists(os.path.join(self.folder, "images", f"{recipe.metadata.raw_id}.jpg")):
-            return f"images/{recipe.metadata.raw_id}.jpg"
-        elif os.path.exists(os.path.join(self.folder, "images", f"{recipe.metadata.id}.png")):
-            return f"images/{recipe.metadata.id}.png"
-        elif os.path.exists(os.path.join(self.folder, "images", f"{recipe.metadata.id}.jpg")):
-            return f"images/{recipe.metadata.id}.jpg"
-        else:
-            return "static/no-image.png"
+        for name in (f"{recipe.metadata.raw_id}.png", f"{recipe.metadata.raw_id}.jpg",
+                     f"{recipe.metadata.id}.png", f"{recipe.metadata.id}.jpg"):
+            if name in self.images:
+                return f"images/{name}"
+        return "static/no-image.png"
+
+    def image_path(self, recipe) -> str:
+        return recipe.image
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """
+        List the recipe files in the cookbook folder along with their modification time and size
+        """
+        files = {}
+        for root, _, filenames in os.walk(self.folder):
+            for file in filenames:
+                _, extension = os.path.splitext(file)
+                if extension not in EXTENSION_MAP:
+                    continue
+                fpath = ospath.join(root, file)
+                try:
+                    stat = os.stat(fpath)
+                except FileNotFoundError:
+                    continue
+                files[fpath] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    @staticmethod
+    def load_file(fpath: str) -> Recipe:
+        _, fname = os.path.split(fpath)
+        stem, extension = os.path.splitext(fname)
+
+        raw_id, lang = os.path.splitext(stem)
+        id = normalize_id(raw_id)
+        lang = lang[1:]
+
+        recipe = EXTENSION_MAP[extension].load(fpath, id, lang, raw_id)
+
+        if type(recipe) is RecipeV1:
+            recipe = recipe.to_v2()
+
+        return recipe
 
     @staticmethod
-    def load_folder(path: str) -> ("Cookbook", List[LoadException]):
-        extension_map = {
-            '.yml': RecipeV1,
-            '.yaml': RecipeV1,
-            '.recipe': RecipeV2,
-        }
-
-        book = Cookbook(path)
+    def load_file_cached(fpath: str, cache: RecipeCache) -> Recipe:
+        recipe = cache.get(fpath)
+        if recipe is None:
+            recipe = Cookbook.load_file(fpath)
+            try:
+                cache.put(fpath, recipe)
+            except OSError:
+                pass  # a read-only or full cache folder only costs us the speedup
+
+        return recipe
+
+    @staticmethod
+    def parse_file(fpath: str, cache: Optional[RecipeCache] = None) -> (Optional[Recipe], Optional[LoadException]):
+        _, file = os.path.split(fpath)
+        try:
+            if cache:
+                return Cookbook.load_file_cached(fpath, cache), None
+            return Cookbook.load_file(fpath), None
+        except LoadException as e:
+            e.add_note(f"in recipe '{file}'")
+            return None, e
+        except Exception as e:
+            load_error = LoadException(e.args[0])
+            load_error.add_cause(e)
+            load_error.add_note(f"in recipe '{file}'")
+            return None, load_error
+
+    def load_files(self, paths: Iterable[str], workers: Optional[int] = None) -> List[LoadException]:
+        paths = list(paths)
+        workers = self.workers if workers is None else workers
+
+        results = [None] * len(paths)
+        if workers > 1 and len(paths) >= PARALLEL_LOAD_THRESHOLD:
+            with ProcessPoolExecutor(workers) as executor:
+                starts = range(0, len(paths), PARALLEL_CHUNK_SIZE)
+                futures = [executor.submit(_parse_files_in_worker, paths[start:start + PARALLEL_CHUNK_SIZE], self.cache)
+                           for start in starts]
+                for start, future in zip(starts, futures):
+                    try:
+                        results[start:start + PARALLEL_CHUNK_SIZE] = future.result()
+                    except Exception:
+                        pass  # e.g. an error that can't be pickled, these files are parsed again below
+
         errors = []
+        for fpath, result in zip(paths, results):
+            recipe, error = result or Cookbook.parse_file(fpath, self.cache)
+            if error:
+                errors.append(error)
+            else:
+                self.add_recipe(recipe)
+                self.recipe_by_path[fpath] = recipe
+
+        return errors
+
+    def refresh(self) -> (Set[str], List[LoadException]):
+        """
+        Re-read the recipe files that were added, changed or removed since the last (re)load and
+        patch the indexes accordingly. The files are parsed in this process, refreshes usually touch
+        only a few recipes and may run while requests are served. Only warnings involving the changed
+        recipes are reported. Returns the affected languages and any errors or warnings.
+        """
+        images = self.scan_images()
+        if images != self.images:
+            self.images = images
+            self.changed()
+            for recipes in self.by_language.values():
+                for recipe in recipes:
+                    recipe.image = self.resolve_image(recipe)
+
+        files = self.scan()
+        removed = [fpath for fpath in self.files if fpath not in files]
+        changed = [fpath for fpath, stat in files.items() if fpath in self.files and self.files[fpath] != stat]
+        added = [fpath for fpath in files if fpath not in self.files]
+        self.files = files
+
+        if not (removed or changed or added):
+            return set(), []
+
+        affected_langs = set()
+        affected_ids = set()
+        affected_tags = set()
+
+        for fpath in removed + changed:
+            recipe = self.recipe_by_path.pop(fpath, None)
+            if recipe:
+                affected_langs.add(recipe.metadata.lang)
+                affected_ids.add(recipe.metadata.id)
+                affected_tags.update(recipe.metadata.tags)
+                self.remove_recipe(recipe)
+
+        errors = self.load_files(changed + added, workers=0)
+
+        for fpath in changed + added:
+            if fpath in self.recipe_by_path:
+                affected_langs.add(self.recipe_by_path[fpath].metadata.lang)
+                affected_ids.add(self.recipe_by_path[fpath].metadata.id)
+                affected_tags.update(self.recipe_by_path[fpath].metadata.tags)
+
+        # recipes in other languages may link to the recipes that appeared or disappeared
+        referencing_langs = {lang for lang, recipes in self.by_language.items()
+                             if any(affected_ids.intersection(recipe.metadata.related) for recipe in recipes)}
+
+        errors += self.validate_tags(affected_langs, affected_tags)
+        errors += self.validate_related(affected_langs | referencing_langs, affected_ids)
+
+        # rebuilt now rather than on the next keystroke in the search bar
+        for lang in affected_langs & self.by_language.keys():
+            self.build_suggestions(lang)
+
+        return affected_langs, errors
+
+    @staticmethod
+    def load_folder(path: str, workers: int = 0, cache_folder: Optional[str] = None) -> ("Cookbook", List[LoadException]):
+        """
+        Load all recipes in the folder. With more than one worker, large folders are parsed in a
+        pool of that many processes; recipes and errors are merged in the same order as a serial load.
+        With a cache folder, recipes whose files have not changed since they were cached are not re-parsed.
+        """
+        book = Cookbook(path, workers, RecipeCache(cache_folder) if cache_folder else None)
         if not ospath.exists(path):
             raise LoadException(f"No cookbook location at {path}")
-        for root, _, files in os.walk(path):
-            for file in files:
-                try:
-                    _, fname = os.path.split(file)
-                    stem, extension = os.path.splitext(fname)
-
-                    if extension not in extension_map:
-                        continue
-
-                    raw_id, lang = os.path.splitext(stem)
-                    id = normalize_id(raw_id)
-                    lang = lang[1:]
-                    fpath = ospath.join(root, file)
-
-                    recipe = extension_map[extension].load(fpath, id, lang, raw_id)
-
-                    if type(recipe) is RecipeV1:
-                        recipe = recipe.to_v2()
-
-                    if id not in book.by_id:
-                        book.by_id[id] = RecipeTranslations()
-                    book.by_id[id].translations[lang] = recipe
-
-                    if lang not in book.by_language:
-                        book.by_language[lang] = []
-                        book.by_lang_and_tag[lang] = {}
-                        book.tagcount_by_language[lang] = {}
-                    book.by_language[lang].append(recipe)
-
-                    for tag in recipe.metadata.tags:
-                        if tag not in book.by_lang_and_tag[lang]:
-                            book.by_lang_and_tag[lang][tag] = []
-                        book.by_lang_and_tag[lang][tag].append(recipe)
-
-                        if not tag in book.tagcount_by_language[lang]:
-                            book.tagcount_by_language[lang][tag] = 0
-                        book.tagcount_by_language[lang][tag] += 1
-
-                except LoadException as e:
-                    e.add_note(f"in recipe '{file}'")
-                    errors.append(e)
-                except Exception as e:
-                    load_error = LoadException(e.args[0])
-                    load_error.add_cause(e)
-                    load_error.add_note(f"in recipe '{file}'")
-                    errors.append(load_error)
+
+        book.images = book.scan_images()
+        book.files = book.scan()
+        errors = book.load_files(book.files.keys())
 
         errors += book.validate_tags()
         errors += book.validate_related()
 
+        book.build_listings()
+
         return book, errors
 
+    def tag_ranking(self, lang) -> List[str]:
+        """
+        Tags of the language by descending number of recipes, kept in order as recipes are added and removed.
+        """
+        if lang not in self.tag_ranking_by_language:
+            return []
+        return self.tag_ranking_by_language[lang].keys
+
     def most_common_tags(self, lang, threshold=4):
-        if lang not in self.tagcount_by_language:
+        return self.tag_ranking(lang)[:threshold]
+
+    def build_suggestions(self, lang) -> PrefixIndex:
+        names = Counter(recipe.metadata.name for recipe in self.by_language[lang])
+        entries = [(name, ('name', name, count), count) for name, count in names.items()]
+        for kind, postings in (('tag', self.tag_bits_by_language[lang]), ('ingr', self.ingr_bits_by_language[lang])):
+            for term, bits in postings.items():
+                count = bits.bit_count()
+                entries.append((term, (kind, term, count), count))
+
+        index = PrefixIndex(entries, SUGGESTION_LIMIT)
+        self.suggestions_by_language[lang] = index
+        return index
+
+    def suggestions(self, lang, prefix: str, n: int = SUGGESTION_LIMIT) -> List[Tuple[str, str, int]]:
+        """
+        Completions of the prefix among the recipe names, tags and ingredients of the language, most
+        common first: (kind, text, number of recipes) with kind 'name', 'tag' or 'ingr'. The index
+        is built once per change to the language.
+        """
+        if lang not in self.by_language:
             return []
 
-        tag_counts = self.tagcount_by_language[lang]
-        sorted_tags = list(map(lambda x: x[0], sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)))
-        return sorted_tags[:threshold]
+        index = self.suggestions_by_language.get(lang)
+        if index is None:
+            index = self.build_suggestions(lang)
+        return index.complete(prefix, n)
+
+
+def _parse_files_in_worker(paths: List[str], cache: Optional[RecipeCache]) -> List[Tuple[Optional[Recipe], Optional[LoadException]]]:
+    return [Cookbook.parse_file(fpath, cache) for fpath in paths]
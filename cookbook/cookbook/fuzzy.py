@@ -0,0 +1,103 @@
+import difflib
+import heapq
+from collections import Counter
+from typing import Dict, List, Optional, Set, Iterable
+
+
+def bigrams(word: str) -> Counter:
+    return Counter(word[i:i + 2] for i in range(len(word) - 1))
+
+
+def _length_bound(a: int, b: int) -> float:
+    # difflib's real_quick_ratio: an upper bound on the similarity of two strings of these lengths
+    return 2.0 * min(a, b) / (a + b) if a + b else 1.0
+
+
+class FuzzyIndex:
+    """
+    Vocabulary index answering the same question as difflib.get_close_matches without running
+    a SequenceMatcher against every word.
+
+    Candidates are generated from the word lengths and the number of shared bigrams. If the matching
+    blocks of two strings of total length T cover M characters, they share at least 3M - T - 1
+    bigrams (each block of size s contributes s - 1, and every block but the first is preceded by
+    at least one unmatched character). A ratio of at least `cutoff` implies M >= cutoff * T / 2,
+    so any word sharing fewer bigrams than that bound can be skipped without changing the result.
+    """
+    def __init__(self, words: Iterable[str] = ()):
+        self.by_length: Dict[int, Set[str]] = {}
+        self.by_bigram: Dict[str, Dict[str, int]] = {}
+        for word in words:
+            self.add(word)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.by_length.get(len(word), ())
+
+    def __len__(self):
+        return sum(map(len, self.by_length.values()))
+
+    def __iter__(self):
+        for words in self.by_length.values():
+            yield from words
+
+    def add(self, word: str):
+        if word in self:
+            return
+        self.by_length.setdefault(len(word), set()).add(word)
+        for gram, count in bigrams(word).items():
+            self.by_bigram.setdefault(gram, {})[word] = count
+
+    def remove(self, word: str):
+        if word not in self:
+            return
+        self.by_length[len(word)].remove(word)
+        if not self.by_length[len(word)]:
+            del self.by_length[len(word)]
+        for gram in bigrams(word):
+            del self.by_bigram[gram][word]
+            if not self.by_bigram[gram]:
+                del self.by_bigram[gram]
+
+    def candidates(self, term: str, cutoff: float) -> Set[str]:
+        lengths = [length for length in self.by_length if _length_bound(len(term), length) >= cutoff]
+        # with T = len(term) + len(word), a match needs at least T * (1.5 * cutoff - 1) - 1 shared bigrams
+        required = {length: (len(term) + length) * (1.5 * cutoff - 1) - 1 - 1e-9 for length in lengths}
+
+        result = set()
+        for length in lengths:
+            if required[length] <= 0:
+                result.update(self.by_length[length])
+
+        shared: Dict[str, int] = {}
+        for gram, count in bigrams(term).items():
+            for word, word_count in self.by_bigram.get(gram, {}).items():
+                shared[word] = shared.get(word, 0) + min(count, word_count)
+
+        for word, count in shared.items():
+            if len(word) in required and count >= required[len(word)]:
+                result.add(word)
+
+        return result
+
+    def close_matches(self, term: str, cutoff: float = 0.6, n: Optional[int] = None) -> List[str]:
+        """
+        Return the words whose similarity to the term is at least `cutoff`, best matches first. With
+        `n`, the result is identical to difflib.get_close_matches(term, words, n, cutoff); without it,
+        all matches are returned.
+        """
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(term)
+
+        result = []
+        for word in self.candidates(term, cutoff):
+            matcher.set_seq1(word)
+            if matcher.real_quick_ratio() >= cutoff and \
+                    matcher.quick_ratio() >= cutoff and \
+                    matcher.ratio() >= cutoff:
+                result.append((matcher.ratio(), word))
+
+        if n is None:
+            result.sort(reverse=True)
+        else:
+            result = heapq.nlargest(n, result)
+        return [word for _, word in result]
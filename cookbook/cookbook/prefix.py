@@ -0,0 +1,92 @@
+import bisect
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# a prefix matching more keys than this has its completions computed when the index is built
+PRECOMPUTE_THRESHOLD = 64
+
+
+def word_starts(text: str) -> List[str]:
+    """
+    The text from the start of each of its words, so that "chocolate cake" is found by "cake" too
+    """
+    words = text.split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def normalize(text: str) -> str:
+    # collapse whitespace, but keep a trailing space: "olive " should not complete to "olives"
+    normalized = " ".join(text.lower().split())
+    if normalized and text[-1:].isspace():
+        normalized += " "
+    return normalized
+
+
+def _successor(prefix: str) -> str:
+    # the smallest string greater than every string starting with the prefix
+    return prefix + "\U0010ffff"
+
+
+class PrefixIndex:
+    """
+    Completions of a prefix from a fixed set of values, each found by the starts of the words of its
+    text and ranked by weight. The keys are kept in a sorted array, so the keys matching a prefix are
+    one slice of it. Prefixes with a long slice, which are the short ones, have their best completions
+    stored when the index is built, so that no lookup scans more than PRECOMPUTE_THRESHOLD keys.
+    """
+    def __init__(self, entries: Iterable[Tuple[str, object, float]], limit: int = 10):
+        """
+        :param entries: (text, value, weight) for each value. Values with higher weight rank first,
+                        then shorter and alphabetically earlier texts.
+        :param limit: the largest number of completions a lookup returns
+        """
+        self.limit = limit
+        ranked = sorted(entries, key=lambda entry: (-entry[2], len(entry[0]), entry[0].lower()))
+        self.values: List[object] = [value for _, value, _ in ranked]
+
+        # (key, rank of the value) in key order; ranks are indices into self.values, lower is better
+        keyed = sorted((key, rank) for rank, (text, _, _) in enumerate(ranked) for key in word_starts(normalize(text)))
+        self.keys: List[str] = [key for key, _ in keyed]
+        self.ranks: List[int] = [rank for _, rank in keyed]
+
+        self.precomputed: Dict[str, List[int]] = {}
+        self._precompute()
+
+    def __len__(self):
+        return len(self.values)
+
+    def _best(self, lo: int, hi: int) -> List[int]:
+        # the same value may be found by several of its words
+        return heapq.nsmallest(self.limit, set(self.ranks[lo:hi]))
+
+    def _precompute(self):
+        # walk down from the one-character prefixes while the slices are long
+        pending = [(0, len(self.keys), 0)]
+        while pending:
+            lo, hi, depth = pending.pop()
+            i = lo
+            while i < hi:
+                if len(self.keys[i]) <= depth:
+                    i += 1  # equal to the parent prefix, which is already covered
+                    continue
+                prefix = self.keys[i][:depth + 1]
+                j = bisect.bisect_left(self.keys, _successor(prefix), i, hi)
+                if j - i > PRECOMPUTE_THRESHOLD:
+                    self.precomputed[prefix] = self._best(i, j)
+                    pending.append((i, j, depth + 1))
+                i = j
+
+    def complete(self, prefix: str, n: Optional[int] = None) -> list:
+        """
+        The best `n` (at most `limit`) values with a word of their text starting with the prefix
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        ranks = self.precomputed.get(prefix)
+        if ranks is None:
+            lo = bisect.bisect_left(self.keys, prefix)
+            hi = bisect.bisect_left(self.keys, _successor(prefix), lo)
+            ranks = self._best(lo, hi)
+        return [self.values[rank] for rank in ranks[:n]]
@@ -0,0 +1,79 @@
+from typing import Dict, List
+
+
+class CountRanking:
+    """
+    Keys ordered by descending count, kept up to date as counts go up or down by one. Keys with the
+    same count form a block of the list, so a change only swaps the key with the first or last key
+    of its block and moves the block boundary, instead of sorting all keys again.
+    """
+    def __init__(self):
+        self.keys: List[str] = []
+        self.counts: Dict[str, int] = {}
+        self.positions: Dict[str, int] = {}
+        # [start, end) of the block of keys with each count
+        self.starts: Dict[int, int] = {}
+        self.ends: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, item):
+        return self.keys[item]
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def count(self, key: str) -> int:
+        return self.counts.get(key, 0)
+
+    def increment(self, key: str):
+        count = self.counts.get(key, 0)
+        if not count:
+            # new keys join the block of count 1, which is always the last one
+            position = len(self.keys)
+            self.keys.append(key)
+            self.positions[key] = position
+        else:
+            position = self._swap(self.positions[key], self.starts[count])
+            self._shrink(count, start=True)
+        self._grow(count + 1, position)
+        self.counts[key] = count + 1
+
+    def decrement(self, key: str):
+        count = self.counts[key]
+        position = self._swap(self.positions[key], self.ends[count] - 1)
+        self._shrink(count, start=False)
+        if count == 1:
+            # the block of count 1 is the last one, so the key is at the end of the list
+            self.keys.pop()
+            del self.positions[key]
+            del self.counts[key]
+        else:
+            self._grow(count - 1, position)
+            self.counts[key] = count - 1
+
+    def _swap(self, i: int, j: int) -> int:
+        keys = self.keys
+        keys[i], keys[j] = keys[j], keys[i]
+        self.positions[keys[i]] = i
+        self.positions[keys[j]] = j
+        return j
+
+    def _shrink(self, count: int, start: bool):
+        if start:
+            self.starts[count] += 1
+        else:
+            self.ends[count] -= 1
+        if self.starts[count] == self.ends[count]:
+            del self.starts[count]
+            del self.ends[count]
+
+    def _grow(self, count: int, position: int):
+        # the position is next to the block of this count, if there is one
+        if count in self.starts:
+            self.starts[count] = min(self.starts[count], position)
+            self.ends[count] = max(self.ends[count], position + 1)
+        else:
+            self.starts[count] = position
+            self.ends[count] = position + 1
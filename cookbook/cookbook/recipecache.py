@@ -0,0 +1,80 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Optional
+
+from .recipev2 import RecipeV2, PARSER_VERSION
+
+
+class RecipeCache:
+    """
+    On-disk cache of parsed recipes. Each entry stores the recipe's source path, size, modification
+    time and content hash along with the parser version that produced it. An entry is used without
+    reading the file if its size and modification time still match; otherwise the content hash decides.
+    Entries that cannot be read are treated as missing and overwritten.
+    """
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def entry_path(self, fpath: str) -> str:
+        key = hashlib.sha256(os.path.abspath(fpath).encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, f"{key}.pickle")
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    def get(self, fpath: str) -> Optional[RecipeV2]:
+        try:
+            stat = os.stat(fpath)
+            with open(self.entry_path(fpath), 'rb') as file:
+                entry = pickle.load(file)
+
+            if entry['version'] != PARSER_VERSION or \
+                    entry['path'] != os.path.abspath(fpath) or \
+                    not isinstance(entry['recipe'], RecipeV2):
+                return None
+            if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                return entry['recipe']
+
+            # touched, checked out or copied: only a changed content needs parsing again
+            with open(fpath, 'rb') as file:
+                content = file.read()
+            if entry['digest'] != self.digest(content):
+                return None
+            try:
+                self.write(fpath, dict(entry, size=len(content), mtime=stat.st_mtime_ns))
+            except OSError:
+                pass
+            return entry['recipe']
+        except Exception:
+            return None  # missing, truncated or written by an incompatible version
+
+    def put(self, fpath: str, recipe: RecipeV2):
+        # stat before reading, a change in between then shows up as a changed modification time
+        stat = os.stat(fpath)
+        with open(fpath, 'rb') as file:
+            content = file.read()
+
+        self.write(fpath, {
+            'version': PARSER_VERSION,
+            'path': os.path.abspath(fpath),
+            'size': len(content),
+            'mtime': stat.st_mtime_ns,
+            'digest': self.digest(content),
+            'recipe': recipe,
+        })
+
+    def write(self, fpath: str, entry: dict):
+        # write to a temporary file first so that concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.entry_path(fpath))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -8,12 +8,15 @@ from cookbook.localization import localize
 
 from .errors import LoadException
 from .recipev2 import RecipeV2, RecipeMeta, RecipeSection, RecipeStep as StepV2
+from .units import merge_ingredients
 
 yaml = YAML()
 yaml.indent(mapping=2, sequence=4, offset=2)
 
 
 class Ingredient:
+    __slots__ = ('ingredient', 'amount', 'amount_per_serving', 'unit')
+
     def __init__(self, serves: int, ingredient: str, amount: int = None, unit: str = None):
         self.ingredient: str = ingredient
         self.amount: Optional[int] = amount
@@ -108,9 +111,6 @@ class RecipeV1:
             for word in note.split():
                 self.word_bag.add(word.lower())
 
-        self.total_ingredients: List[Ingredient] = []
-        self.ingr_bag: Set[str] = set()
-
         self.related_recipes: List[Union[str, RecipeV1]] = []
         for related in (related or []):
             self.related_recipes.append(self.normalize_id(related))
@@ -143,6 +143,11 @@ class RecipeV1:
         self.passive_cooking2: List[RecipeStep] = []
         self.parse_section("Passive cooking pt. 2", passive_cooking2, self.passive_cooking2)
 
+        steps = self.prep + self.mis_en_place + self.cooking + self.passive_cooking + self.cooking2 + self.passive_cooking2
+        self.total_ingredients: List[Ingredient] = merge_ingredients((ingr for step in steps for ingr in step.ingredients),
+                                                                     self.serves, Ingredient)
+        self.ingr_bag: Set[str] = {ingr.ingredient.lower() for ingr in self.total_ingredients}
+
     def to_v2(self) -> RecipeV2:
         metadata = RecipeMeta()
         metadata.id = self.id
@@ -186,10 +191,7 @@ class RecipeV1:
         if yaml_section is not None:
             for i, step in enumerate(yaml_section):
                 try:
-                    rstep = RecipeStep(self.serves, **step)
-                    list_section.append(rstep)
-                    for ingr in rstep.ingredients:
-                        self.merge_ingredient(ingr)
+                    list_section.append(RecipeStep(self.serves, **step))
                 except TypeError as e:
                     if e.args and 'required positional argument' in e.args[0]:
                         field = e.args[0].split('\'')[1]
@@ -205,31 +207,6 @@ class RecipeV1:
                     e.args = (f"Recipe {self.id}.{self.lang}: {sec_name} step {i + 1}: {e.args[0]}",)
                     raise e
 
-    def merge_ingredient(self, new_ingr: Ingredient):
-        found = False
-        for old_ingr in self.total_ingredients:
-            if old_ingr.ingredient == new_ingr.ingredient:
-                if old_ingr.unit == new_ingr.unit:
-                    if new_ingr.amount and not old_ingr.amount:
-                        old_ingr.amount = new_ingr.amount
-                        old_ingr.amount_per_serving = new_ingr.amount_per_serving
-                    elif new_ingr.amount and old_ingr.amount:
-                        old_ingr.amount += new_ingr.amount
-                        old_ingr.amount_per_serving += new_ingr.amount_per_serving
-                    found = True
-                # TODO unit conversion
-        if not found:
-            self.ingr_bag.add(new_ingr.ingredient.lower())
-            if not new_ingr.amount:  # ingredients without amounts go to the end
-                self.total_ingredients.append(Ingredient(self.serves, new_ingr.ingredient, new_ingr.amount, new_ingr.unit))
-            else:  # ingredients with amounts go before ingredients without amounts
-                i = 0
-                while i < len(self.total_ingredients):
-                    if not self.total_ingredients[i].amount:
-                        break
-                    i += 1
-                self.total_ingredients.insert(i, Ingredient(self.serves, new_ingr.ingredient, new_ingr.amount, new_ingr.unit))
-
     def has_ingredient(self, wanted_ingr: str) -> bool:
         return wanted_ingr.lower() in self.ingr_bag
 
@@ -2,16 +2,98 @@ import difflib
 import itertools
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Union, Optional, Set, TextIO
+from typing import List, Union, Optional, Set, TextIO, Tuple, FrozenSet
+import re
 import shlex
+import sys
 
 from .errors import LoadException
+from .units import merge_ingredients
+
+# Stamp for the parsed representation of recipes. Bump whenever the parser or the recipe classes change,
+# so that recipes cached by an older version are parsed again.
+PARSER_VERSION = 5
 
 
 def normalize_id(id):
     return id.strip().lower().replace(' ', '-')
 
+
+def intern(value):
+    """
+    sys.intern for strings, other values (e.g. the numbers of a YAML recipe) pass through
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+_SHELL_WORD = re.compile(r'[^ \t\r\n]+')
+_SHELL_QUOTED_WORD = re.compile(r'''(?:[^ \t\r\n'"]|'[^']*'|"[^"]*")+|(['"])''')
+_SHELL_QUOTE = re.compile(r''''[^']*'|"[^"]*"''')
+
+
+def split_words(line: str) -> List[str]:
+    """
+    Same as shlex.split, but only lines with escapes or unbalanced quotes go through the (much slower) shlex lexer
+    """
+    if "\\" in line:
+        return shlex.split(line)
+    if "'" not in line and '"' not in line:
+        return _SHELL_WORD.findall(line)
+
+    words = []
+    for match in _SHELL_QUOTED_WORD.finditer(line):
+        if match.group(1):
+            return shlex.split(line)  # unbalanced quote, let shlex raise its error
+        words.append(_SHELL_QUOTE.sub(lambda quoted: quoted[0][1:-1], match[0]))
+    return words
+
+
+class RecipeLines:
+    """
+    The lines of a recipe file, split from the whole buffer at once. `readline` returns them exactly
+    like a file would, newline included, but the parser can also look at the next line without
+    consuming it instead of seeking back.
+    """
+    def __init__(self, text: str):
+        lines = text.split("\n")
+        last = lines.pop()
+        self.lines = [line + "\n" for line in lines]
+        if last:
+            self.lines.append(last)
+        self.pos = 0
+
+    def readline(self) -> str:
+        if self.pos < len(self.lines):
+            self.pos += 1
+            return self.lines[self.pos - 1]
+        return ""
+
+    def peek(self) -> str:
+        return self.lines[self.pos] if self.pos < len(self.lines) else ""
+
+    def read_block(self) -> List[str]:
+        """
+        Consume the lines up to and including the next blank line, returns the lines before it
+        """
+        start = end = self.pos
+        while end < len(self.lines) and self.lines[end].strip() != "":
+            end += 1
+        self.pos = min(end + 1, len(self.lines))
+        return self.lines[start:end]
+
+    def skip_blank_lines(self) -> bool:
+        """
+        Advance to the next line with content, returns False if there is none left
+        """
+        while self.pos < len(self.lines) and self.lines[self.pos].strip() == "":
+            self.pos += 1
+        return self.pos < len(self.lines)
+
+
 class RecipeMeta:
+    __slots__ = ('schema_version', 'id', 'lang', 'name', 'raw_id', 'serves', 'servings_unit', 'servings_increment',
+                 'desc', 'note', 'tags', 'related', 'attribution', 'hide_from_all', '_set_attrs')
+
     def __init__(self):
         self.schema_version: int = 2
         self.id: str = None
@@ -23,13 +105,24 @@ class RecipeMeta:
         self.servings_increment: Union[float, int] = 1
         self.desc: Optional[str] = None
         self.note: Optional[str] = None
-        self.tags: List[str] = []
-        self.related: List[str] = []
+        self.tags: Union[List[str], Tuple[str, ...]] = []  # tuples once the recipe is built
+        self.related: Union[List[str], Tuple[str, ...]] = []
         self.attribution: Optional[str] = None
         self.hide_from_all: bool = False
 
         self._set_attrs: set = set()
 
+    def __setstate__(self, state):
+        _, slots = state
+        for name, value in slots.items():
+            setattr(self, name, value)
+        self.share_strings()
+
+    def share_strings(self):
+        self.lang = intern(self.lang)
+        self.servings_unit = intern(self.servings_unit)
+        self.tags = tuple(map(intern, self.tags))
+        self.related = tuple(map(intern, self.related))
 
     def set_once(self, name, val):
         if not hasattr(self, name):
@@ -56,7 +149,7 @@ class RecipeMeta:
             raise LoadException(f"Recipe {self.id}.{self.lang}: schema version (`version`) expected to be 2, is {self.schema_version}")
 
     @staticmethod
-    def read_multiline(file: TextIO) -> (str, str):
+    def read_multiline(file: RecipeLines) -> (str, str):
         acc = ""
         while True:
             line = file.readline()
@@ -66,7 +159,7 @@ class RecipeMeta:
                 return acc, line
 
     @staticmethod
-    def parse(file: TextIO, id, lang, raw_id) -> 'RecipeMeta':
+    def parse(file: RecipeLines, id, lang, raw_id) -> 'RecipeMeta':
         metadata = RecipeMeta()
         metadata.id = id
         metadata.lang = lang
@@ -78,7 +171,7 @@ class RecipeMeta:
             if line.startswith("name "):
                 metadata.set_once('name', line[5:].strip())
             elif line.startswith("serves "):
-                parts = shlex.split(line)
+                parts = split_words(line)
                 metadata.set_once('serves', int(parts[1]))
                 if len(parts) > 2:
                     metadata.set_once('servings_unit', parts[2])
@@ -118,6 +211,8 @@ class RecipeMeta:
         return metadata
 
 class Ingredient:
+    __slots__ = ('ingredient', 'amount', 'amount_per_serving', 'unit')
+
     def __init__(self, serves: float, ingredient: str, amount: float = None, unit: str = None):
         self.ingredient: str = ingredient
         self.amount: Optional[float] = amount
@@ -129,7 +224,7 @@ class Ingredient:
 
     @staticmethod
     def parse(line: str, serves: float) -> 'Ingredient':
-        parts = shlex.split(line)
+        parts = split_words(line)
         if not parts:
             raise LoadException(f"Can't parse ingredient '{line}': missing information")
 
@@ -144,7 +239,7 @@ class Ingredient:
             raise LoadException(f"Can't parse amount of ingredient '{line}' (lexed as {parts})")
 
 
-@dataclass
+@dataclass(slots=True)
 class Scalar:
     amount: float
     amount_per_serving: float
@@ -152,8 +247,11 @@ class Scalar:
 InstrPart = Union[str, Scalar]
 
 def split_instr(line: str, serves) -> List[InstrPart]:
-    result = []
     parts = line.split()
+    if "{" not in line:
+        return parts
+
+    result = []
     for part in parts:
         if part and part[0] == '{' and part[-1] == '}':
             amt = float(part[1:-1])
@@ -163,23 +261,31 @@ def split_instr(line: str, serves) -> List[InstrPart]:
 
     return result
 
-@dataclass
+@dataclass(slots=True)
 class RecipeStep:
     serves: float
-    instructions: List[InstrPart]
-    ingredients: List[Ingredient]
-    internal_ingredients: List[str]
-    hidden_ingredients: List[str]
-    yields: List[str]
+    instructions: Tuple[InstrPart, ...]
+    ingredients: Tuple[Ingredient, ...]
+    internal_ingredients: Tuple[str, ...]
+    hidden_ingredients: Tuple[str, ...]
+    yields: Tuple[str, ...]
     no_dep: bool = False
-    upstream: List["RecipeStep"] = field(default_factory=list)
-    downstream: List["RecipeStep"] = field(default_factory=list)
+    # filled in by RecipeV2.build_dep_graph, which turns them into tuples once done
+    upstream: Union[List["RecipeStep"], Tuple["RecipeStep", ...]] = field(default_factory=list)
+    downstream: Union[List["RecipeStep"], Tuple["RecipeStep", ...]] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.instructions = tuple(self.instructions)
+        self.ingredients = tuple(self.ingredients)
+        self.internal_ingredients = tuple(self.internal_ingredients)
+        self.hidden_ingredients = tuple(self.hidden_ingredients)
+        self.yields = tuple(self.yields)
 
     def rows(self):
         return max(1, len(self.ingredients) + len(self.internal_ingredients))
 
     @staticmethod
-    def parse(file: TextIO, serves: float) -> 'RecipeStep':
+    def parse(file: RecipeLines, serves: float) -> 'RecipeStep':
         ingredients: List[Ingredient] = []
         internal_ingredients: List[str] = []
         hidden_ingredients: List[str] = []
@@ -187,39 +293,45 @@ class RecipeStep:
         yields: List[str] = []
         no_dep = False
 
-        line = file.readline()
-        while line.strip() != "":
-            if line.startswith("- "):
+        for line in file.read_block():
+            # only lines starting with '-', '=' or '@' can be anything but instructions
+            marker = line[0]
+            if marker == "-" and line.startswith("- "):
                 ingredients.append(Ingredient.parse(line[2:], serves))
-            elif line.startswith("= "):
+            elif marker == "=" and line.startswith("= "):
                 internal_ingredients.append(line[2:].strip())
-            elif line.startswith("@nodep"):
+            elif marker == "@" and line.startswith("@nodep"):
                 no_dep = True
-            elif line.startswith("@ "):
+            elif marker == "@" and line.startswith("@ "):
                 hidden_ingredients.append(line[2:].strip())
-            elif line.startswith("-> "):
+            elif marker == "-" and line.startswith("-> "):
                 yields.append(line[3:].lower().strip())
             else:
-                instructions += split_instr(line.strip(), serves)
-            line = file.readline()
+                instructions.extend(split_instr(line.strip(), serves))
 
         return RecipeStep(serves, instructions, ingredients, internal_ingredients, hidden_ingredients, yields, no_dep)
 
-@dataclass
+@dataclass(slots=True)
 class RecipeSection:
-    steps: List[RecipeStep]
+    steps: Tuple[RecipeStep, ...]
     heading: Optional[str] = None
 
+    def __post_init__(self):
+        self.steps = tuple(self.steps)
+
 
 class RecipeV2:
+    __slots__ = ('metadata', 'sections', 'root_steps', 'image', 'word_bag', 'total_ingredients', 'ingr_bag')
+
     def __init__(self,
                  metadata: RecipeMeta,
                  sections: List[RecipeSection]):
         self.metadata = metadata
-        self.sections = sections
-        self.root_steps = []
+        self.sections: Tuple[RecipeSection, ...] = tuple(sections)
+        self.root_steps: Union[List[RecipeStep], Tuple[RecipeStep, ...]] = []
+        self.image: Optional[str] = None  # resolved by the cookbook, see Cookbook.resolve_image
 
-        self.word_bag: Set[str] = set()
+        self.word_bag: Union[Set[str], FrozenSet[str]] = set()
 
         for word in metadata.name.split():
             self.word_bag.add(word.lower())
@@ -230,38 +342,39 @@ class RecipeV2:
             for word in metadata.note.split():
                 self.word_bag.add(word.lower())
 
-        self.total_ingredients: List[Ingredient] = []
-        self.ingr_bag: Set[str] = set()
+        all_ingredients = (ingredient for section in self.sections for step in section.steps for ingredient in step.ingredients)
+        self.total_ingredients: Tuple[Ingredient, ...] = tuple(merge_ingredients(all_ingredients, metadata.serves, Ingredient))
+        self.ingr_bag: Union[Set[str], FrozenSet[str]] = {ingredient.ingredient.lower() for ingredient in self.total_ingredients}
+
+        self.share_strings()
 
-        for section in sections:
+    def __setstate__(self, state):
+        _, slots = state
+        for name, value in slots.items():
+            setattr(self, name, value)
+        self.share_strings()
+
+    def share_strings(self):
+        """
+        Replace strings that repeat across the corpus (tags, units, ingredients, words) with one shared copy each
+        and freeze the tag, word and ingredient collections. Also runs after unpickling, which loses interning.
+        """
+        self.metadata.share_strings()
+
+        ingredients = list(self.total_ingredients)
+        for section in self.sections:
             for step in section.steps:
-                for ingredient in step.ingredients:
-                    self.merge_ingredient(ingredient)
-
-    def merge_ingredient(self, new_ingr: Ingredient):
-        found = False
-        for old_ingr in self.total_ingredients:
-            if old_ingr.ingredient == new_ingr.ingredient:
-                if old_ingr.unit == new_ingr.unit:
-                    if new_ingr.amount and not old_ingr.amount:
-                        old_ingr.amount = new_ingr.amount
-                        old_ingr.amount_per_serving = new_ingr.amount_per_serving
-                    elif new_ingr.amount and old_ingr.amount:
-                        old_ingr.amount += new_ingr.amount
-                        old_ingr.amount_per_serving += new_ingr.amount_per_serving
-                    found = True
-                # TODO unit conversion
-        if not found:
-            self.ingr_bag.add(new_ingr.ingredient.lower())
-            if not new_ingr.amount:  # ingredients without amounts go to the end
-                self.total_ingredients.append(Ingredient(self.metadata.serves, new_ingr.ingredient, new_ingr.amount, new_ingr.unit))
-            else:  # ingredients with amounts go before ingredients without amounts
-                i = 0
-                while i < len(self.total_ingredients):
-                    if not self.total_ingredients[i].amount:
-                        break
-                    i += 1
-                self.total_ingredients.insert(i, Ingredient(self.metadata.serves, new_ingr.ingredient, new_ingr.amount, new_ingr.unit))
+                step.instructions = tuple(map(intern, step.instructions))
+                step.internal_ingredients = tuple(map(intern, step.internal_ingredients))
+                step.hidden_ingredients = tuple(map(intern, step.hidden_ingredients))
+                step.yields = tuple(map(intern, step.yields))
+                ingredients.extend(step.ingredients)
+        for ingredient in ingredients:
+            ingredient.ingredient = intern(ingredient.ingredient)
+            ingredient.unit = intern(ingredient.unit)
+
+        self.word_bag = frozenset(map(intern, self.word_bag))
+        self.ingr_bag = frozenset(map(intern, self.ingr_bag))
 
     def has_ingredient(self, wanted_ingr: str) -> bool:
         return wanted_ingr.lower() in self.ingr_bag
@@ -327,6 +440,12 @@ class RecipeV2:
             if not found:
                 raise LoadException(f"Yield {_yield} defined but never used")
 
+        self.root_steps = tuple(self.root_steps)
+        for section in self.sections:
+            for step in section.steps:
+                step.upstream = tuple(step.upstream)
+                step.downstream = tuple(step.downstream)
+
     @staticmethod
     def load(path: Path, id, lang, raw_id) -> "RecipeV2":
         with open(path, encoding='utf-8') as file:
@@ -334,37 +453,30 @@ class RecipeV2:
 
     @staticmethod
     def parse(file: TextIO, id, lang, raw_id) -> 'RecipeV2':
-        meta = RecipeMeta.parse(file, id, lang, raw_id)
+        lines = RecipeLines(file.read())
+        meta = RecipeMeta.parse(lines, id, lang, raw_id)
 
         sections = []
 
         current_section_steps = []
         current_section_heading = None
 
-        pos = file.tell()
-        line = file.readline()
-        while line:
-            while line.strip() == "":
-                pos = file.tell()
-                line = file.readline()
-
+        while lines.skip_blank_lines():
+            line = lines.peek()
             if line.startswith("# "):
+                lines.readline()
                 if current_section_heading:
                     sections.append(RecipeSection(current_section_steps, current_section_heading))
 
                 current_section_heading = line[2:].strip()
                 current_section_steps = []
             else:
-                file.seek(pos)
                 try:
-                    current_section_steps.append(RecipeStep.parse(file, meta.serves))
+                    current_section_steps.append(RecipeStep.parse(lines, meta.serves))
                 except LoadException as e:
                     e.add_note(f'In step #{len(current_section_steps) + 1} of section #{len(sections) + 1} ({current_section_heading if current_section_heading else "<untitled>"})')
                     raise e
 
-            pos = file.tell()
-            line = file.readline()
-
         if current_section_steps:
             sections.append(RecipeSection(current_section_steps, current_section_heading))
 
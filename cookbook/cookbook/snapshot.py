@@ -0,0 +1,223 @@
+import contextlib
+import io
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+from array import array
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where concurrently starting workers may each build the snapshot
+    fcntl = None
+
+from .cookbook import Cookbook
+from .errors import LoadException
+from .recipev2 import RecipeV2, RecipeMeta, PARSER_VERSION
+
+MAGIC = b"COOKSNAP"
+# increase whenever the layout below or the pickled Cookbook attributes change
+FORMAT_VERSION = 5
+
+# magic, format version, parser version, number of recipes, offsets of the recipe table, the recipe
+# heads, the cookbook and the end of the file. The recipe bodies follow the header directly, the
+# table holds the (offset, length) of each body.
+HEADER = struct.Struct("<8sIII4Q")
+
+
+class SnapshotRecipe:
+    """
+    Stand-in for a recipe stored in a snapshot. The metadata and image, which listings and search
+    need for every recipe, are kept in memory; everything else is decoded from the snapshot the
+    first time it is used, e.g. when the recipe's page is rendered.
+    """
+    __slots__ = ('metadata', 'image', '_snapshot', '_ordinal', '_recipe')
+
+    def __init__(self, snapshot: 'Snapshot', ordinal: int, metadata: RecipeMeta, image: Optional[str]):
+        self.metadata = metadata
+        self.image = image
+        self._snapshot = snapshot
+        self._ordinal = ordinal
+        self._recipe: Optional[RecipeV2] = None
+
+    def decoded(self) -> RecipeV2:
+        recipe = self._recipe
+        if recipe is None:
+            recipe = self._snapshot.decode(self._ordinal)
+            recipe.metadata = self.metadata
+            recipe.image = self.image
+            self._recipe = recipe
+        return recipe
+
+    def __getattr__(self, name):
+        # only called for attributes the stand-in does not have itself
+        return getattr(self.decoded(), name)
+
+    def __repr__(self):
+        return f"<SnapshotRecipe {self.metadata.id}.{self.metadata.lang}>"
+
+
+class Snapshot:
+    """
+    Read-only memory map of a snapshot file. The pages of the file are shared by every process
+    that maps it, recipes are only unpickled into a process when they are used there.
+    """
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        magic, format_version, parser_version, count, table, heads, book, end = HEADER.unpack_from(self.map)
+        if magic != MAGIC or format_version != FORMAT_VERSION or parser_version != PARSER_VERSION \
+                or end != len(self.map):
+            raise ValueError(f"{path} is not a snapshot of this version")
+
+        self.offsets = array('Q')
+        self.offsets.frombytes(self.view[table:heads])
+        if len(self.offsets) != 2 * count:
+            raise ValueError(f"{path} is truncated")
+
+        self.heads = (heads, book)
+        self.book = (book, end)
+
+    def decode(self, ordinal: int) -> RecipeV2:
+        offset, length = self.offsets[2 * ordinal], self.offsets[2 * ordinal + 1]
+        return pickle.loads(self.view[offset:offset + length])
+
+    def load(self) -> (Cookbook, List[LoadException]):
+        start, end = self.heads
+        recipes = [SnapshotRecipe(self, ordinal, metadata, image)
+                   for ordinal, (metadata, image) in enumerate(pickle.loads(self.view[start:end]))]
+
+        start, end = self.book
+        unpickler = pickle.Unpickler(io.BytesIO(self.view[start:end]))
+        unpickler.persistent_load = recipes.__getitem__
+        return unpickler.load()
+
+
+class _BookPickler(pickle.Pickler):
+    """
+    Pickles the cookbook with every recipe replaced by its number in the snapshot
+    """
+    def __init__(self, file, ordinals):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.ordinals = ordinals
+
+    def persistent_id(self, obj):
+        if isinstance(obj, (RecipeV2, SnapshotRecipe)):
+            return self.ordinals[id(obj)]
+        return None
+
+
+def write_snapshot(book: Cookbook, errors: List[LoadException], path: str):
+    recipes = [recipe for recipes in book.by_language.values() for recipe in recipes]
+    ordinals = {id(recipe): ordinal for ordinal, recipe in enumerate(recipes)}
+    errors = [error if _picklable(error) else _without_cause(error) for error in errors]
+
+    # write to a temporary file first so that workers starting meanwhile never map a partial snapshot
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(bytes(HEADER.size))
+            offsets = array('Q')
+            for recipe in recipes:
+                if isinstance(recipe, SnapshotRecipe):
+                    recipe = recipe.decoded()
+                body = pickle.dumps(recipe, protocol=pickle.HIGHEST_PROTOCOL)
+                offsets.extend((file.tell(), len(body)))
+                file.write(body)
+
+            table = file.tell()
+            file.write(offsets.tobytes())
+            heads = file.tell()
+            pickle.dump([(recipe.metadata, recipe.image) for recipe in recipes], file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+            start = file.tell()
+            _BookPickler(file, ordinals).dump((book, errors))
+            end = file.tell()
+
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, PARSER_VERSION, len(recipes), table, heads, start, end))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_snapshot(path: str, folder: str) -> Optional[Tuple[Cookbook, List[LoadException]]]:
+    """
+    Load the cookbook from the snapshot, if there is one for this version of the cookbook and the
+    recipe folder has not changed since it was written
+    """
+    try:
+        book, errors = Snapshot(path).load()
+    except Exception:
+        return None  # missing, truncated or written by an incompatible version
+
+    if os.path.abspath(book.folder) != os.path.abspath(folder) or \
+            book.scan() != book.files or book.scan_images() != book.images:
+        return None
+    return book, errors
+
+
+def load_shared(path: str, folder: str, workers: int = 0,
+                cache_folder: Optional[str] = None) -> (Cookbook, List[LoadException]):
+    """
+    Load the cookbook from the snapshot at `path`, building the snapshot from the recipe folder first
+    if it is missing or out of date. Of several processes starting at the same time, one builds the
+    snapshot while the others wait for it.
+    """
+    with _locked(path, exclusive=False):
+        loaded = read_snapshot(path, folder)
+    if loaded:
+        return loaded
+
+    with _locked(path, exclusive=True):
+        loaded = read_snapshot(path, folder)  # another process may have built it while we waited
+        if loaded:
+            return loaded
+
+        book, errors = Cookbook.load_folder(folder, workers, cache_folder)
+        try:
+            write_snapshot(book, errors, path)
+        except OSError:
+            return book, errors  # a read-only or full location only costs us the sharing
+
+        # continue from the snapshot too, so that this process does not keep its own copy of the recipes
+        return read_snapshot(path, folder) or (book, errors)
+
+
+@contextlib.contextmanager
+def _locked(path: str, exclusive: bool):
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _picklable(error: Exception) -> bool:
+    try:
+        pickle.dumps(error)
+        return True
+    except Exception:
+        return False
+
+
+def _without_cause(error: Exception) -> LoadException:
+    copy = LoadException(error.args[0] if error.args else str(error))
+    copy.context = list(getattr(error, 'context', []))
+    if getattr(error, 'cause', None):
+        copy.add_cause(LoadException(f"{type(error.cause).__name__}: {error.cause}"))
+    return copy
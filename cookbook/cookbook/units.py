@@ -0,0 +1,124 @@
+import math
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+
+MASS = "mass"
+VOLUME = "volume"
+COUNT = "count"
+
+# unit (lower case) -> (dimension, size in the dimension's base unit: grams, milliliters or pieces)
+UNITS: Dict[str, Tuple[str, float]] = {
+    "mg": (MASS, 0.001),
+    "g": (MASS, 1), "gram": (MASS, 1), "grams": (MASS, 1), "gramm": (MASS, 1),
+    "kg": (MASS, 1000), "kilo": (MASS, 1000), "kilogram": (MASS, 1000), "kilograms": (MASS, 1000),
+    "oz": (MASS, 28.349523125), "ounce": (MASS, 28.349523125), "ounces": (MASS, 28.349523125),
+    "lb": (MASS, 453.59237), "lbs": (MASS, 453.59237), "pound": (MASS, 453.59237), "pounds": (MASS, 453.59237),
+
+    "ml": (VOLUME, 1), "milliliter": (VOLUME, 1), "milliliters": (VOLUME, 1), "millilitre": (VOLUME, 1),
+    "millilitres": (VOLUME, 1),
+    "cl": (VOLUME, 10), "dl": (VOLUME, 100),
+    "l": (VOLUME, 1000), "liter": (VOLUME, 1000), "liters": (VOLUME, 1000), "litre": (VOLUME, 1000),
+    "litres": (VOLUME, 1000),
+    "tsp": (VOLUME, 5), "teaspoon": (VOLUME, 5), "teaspoons": (VOLUME, 5), "tl": (VOLUME, 5),
+    "tbsp": (VOLUME, 15), "tablespoon": (VOLUME, 15), "tablespoons": (VOLUME, 15), "el": (VOLUME, 15),
+    "cup": (VOLUME, 240), "cups": (VOLUME, 240),
+    "fl oz": (VOLUME, 29.5735295625),
+
+    "pc": (COUNT, 1), "pcs": (COUNT, 1), "piece": (COUNT, 1), "pieces": (COUNT, 1), "stück": (COUNT, 1),
+    "stk": (COUNT, 1),
+}
+
+# units that totals are converted to, largest first: a total is given in the largest one it is at least one of
+READABLE_UNITS: Dict[str, List[Tuple[str, float]]] = {
+    MASS: [("kg", 1000), ("g", 1)],
+    VOLUME: [("l", 1000), ("ml", 1)],
+}
+
+# significant digits of totals added up from several lines
+TOTAL_PRECISION = 3
+
+
+def dimension(unit) -> (Hashable, float):
+    """
+    The dimension a unit measures and its size in the dimension's base unit. Amounts without a unit
+    are counts; units missing from UNITS only convert to themselves.
+    """
+    if unit is None:
+        return COUNT, 1
+    if type(unit) is str and unit.lower() in UNITS:
+        return UNITS[unit.lower()]
+    return ("unit", unit), 1
+
+
+def round_significant(num: float, digits: int = TOTAL_PRECISION) -> float:
+    if not num:
+        return num
+    return round(num, digits - 1 - math.floor(math.log10(abs(num))))
+
+
+def is_metric(size: float) -> bool:
+    # metric units are powers of ten of the base unit, unlike e.g. tablespoons or ounces
+    return size > 0 and math.log10(size).is_integer()
+
+
+def tidy_total(total, dim: Hashable, size: float, mixed: bool):
+    """
+    Give an ingredient total added up from several lines in a readable unit and precision. Totals in metric
+    units, or added up from different units, move to the largest of READABLE_UNITS they are at least one of
+    (e.g. 1250 ml is given as 1.25 l). Other totals keep their unit. The amount is rounded to TOTAL_PRECISION
+    significant digits.
+    """
+    amount = total.amount
+    ladder = READABLE_UNITS.get(dim)
+    if ladder and (mixed or is_metric(size)):
+        base_amount = amount * size
+        unit, unit_size = next(((unit, unit_size) for unit, unit_size in ladder if base_amount >= unit_size),
+                               ladder[-1])
+        amount = base_amount / unit_size
+        total.unit = unit
+    rounded = round_significant(amount)
+    total.amount_per_serving *= rounded / total.amount
+    total.amount = rounded
+
+
+def merge_ingredients(ingredients: Iterable, serves: float, make: Callable) -> List:
+    """
+    Add up the ingredients of a recipe. Ingredients with the same name merge if their units measure the
+    same dimension; the total is rounded and converted to a readable unit, see tidy_total. `make`
+    creates the total entries from (serves, ingredient, amount, unit). Ingredients with amounts are
+    listed first, in order of appearance, followed by those without.
+    """
+    totals: Dict[Tuple[str, Hashable], object] = {}
+    sizes: Dict[Tuple[str, Hashable], float] = {}
+    # totals with the amounts of several lines, and whether those were in different units
+    mixed: Dict[Tuple[str, Hashable], bool] = {}
+
+    for ingredient in ingredients:
+        dim, size = dimension(ingredient.unit)
+        key = (ingredient.ingredient, dim)
+        total = totals.get(key)
+        if total is None:
+            totals[key] = make(serves, ingredient.ingredient, ingredient.amount, ingredient.unit)
+            sizes[key] = size
+        elif not ingredient.amount:
+            continue
+        elif not total.amount:
+            total.amount = ingredient.amount
+            total.amount_per_serving = ingredient.amount_per_serving
+            total.unit = ingredient.unit
+            sizes[key] = size
+        elif size == sizes[key]:
+            total.amount += ingredient.amount
+            total.amount_per_serving += ingredient.amount_per_serving
+            mixed.setdefault(key, False)
+        else:
+            scale = size / sizes[key]
+            total.amount += ingredient.amount * scale
+            total.amount_per_serving += ingredient.amount_per_serving * scale
+            mixed[key] = True
+
+    for key, different_units in mixed.items():
+        tidy_total(totals[key], key[1], sizes[key], different_units)
+
+    with_amount = [total for total in totals.values() if total.amount]
+    without_amount = [total for total in totals.values() if not total.amount]
+    return with_amount + without_amount
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Set, Tuple
+from urllib.parse import quote
+
+from .common import get_data_path
+from .compression import FILE_SUFFIXES, write_precompressed
+from .cookbook.cookbook import Cookbook
+from .cookbook.recipev2 import PARSER_VERSION
+from .main import app, create_app, thumbnails
+
+MANIFEST = ".export-manifest.json"
+
+
+def fingerprint(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def tree_state(folder: str) -> List[Tuple[str, int, int]]:
+    state = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            stat = os.stat(os.path.join(root, file))
+            state.append((os.path.relpath(os.path.join(root, file), folder), stat.st_mtime_ns, stat.st_size))
+    return sorted(state)
+
+
+def search_file(query: str) -> str:
+    # nginx looks the page up by the raw (still url-encoded) query argument, see the README
+    encoded = quote(query, safe="'")
+    return f"search/{encoded}.html"
+
+
+def pages(book: Cookbook, common_tags: int) -> List[Tuple[str, str, str]]:
+    """
+    List the pages to export as (url, output file, fingerprint of the page's inputs)
+    """
+    config = {key: app.config.get(key) for key in ("SITE_NAME", "BASE_URL", "APPLICATION_ROOT", "DEFAULT_LANG",
+                                                   "THUMBNAIL_WIDTHS", "THUMBNAIL_FORMAT", "FACET_COUNT",
+                                                   "LISTING_PAGE_SIZE", "SEARCH_SUGGESTIONS")}
+    site = fingerprint(PARSER_VERSION, config, thumbnails is not None,
+                       tree_state(get_data_path("Templates")), tree_state(get_data_path("localization")))
+    # listings show every recipe of the language, so they change whenever any recipe does
+    everything = fingerprint(site, sorted(book.files.items()), sorted(book.images))
+
+    source_by_recipe = {recipe: fpath for fpath, recipe in book.recipe_by_path.items()}
+
+    result = [("/", "index.html", everything)]
+    for lang in book.by_language:
+        result.append((f"/{lang}/", f"{lang}/index.html", everything))
+        result.append((f"/{lang}/all", f"{lang}/all/index.html", everything))
+
+        for tag in book.most_common_tags(lang, common_tags):
+            query = f"tag:'{tag}'"
+            result.append((f"/{lang}/search?query={quote(query)}", f"{lang}/{search_file(query)}", everything))
+
+    for id, recipe_trans in book.by_id.items():
+        translations = {lang: (source_by_recipe.get(recipe), book.files.get(source_by_recipe.get(recipe)))
+                        for lang, recipe in recipe_trans.translations.items()}
+        for lang in book.by_language:
+            recipe = recipe_trans.translations.get(lang) or next(iter(recipe_trans.translations.values()))
+            related = {rel: book.by_id[rel].get_name(lang) if rel in book.by_id else None
+                       for rel in recipe.metadata.related}
+            result.append((f"/{lang}/recipe/{quote(id)}", f"{lang}/recipe/{id}/index.html",
+                           fingerprint(site, translations, related, recipe.image, app.config["DEFAULT_LANG"])))
+
+    return result
+
+
+def render_page(url: str, target: str) -> int:
+    response = app.test_client().get(url)
+    if response.status_code == 200:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as file:
+            file.write(response.get_data())
+        write_precompressed(target)
+    return response.status_code
+
+
+def sync_tree(source: str, target: str, outputs: Set[str]) -> int:
+    """
+    Copy a folder, skipping files whose size and modification time already match, and write compressed
+    copies of text files. Adds the paths of the copies to `outputs`. Returns the number of copied files.
+    """
+    copied = 0
+    for root, _, files in os.walk(source):
+        for file in files:
+            src = os.path.join(root, file)
+            dst = os.path.join(target, os.path.relpath(src, source))
+            copied += copy_file(src, dst)
+            outputs.add(dst)
+    return copied
+
+
+def copy_file(src: str, dst: str) -> bool:
+    """
+    Copy a file unless its size and modification time already match, and write compressed copies of
+    text files. Returns whether the file was copied.
+    """
+    if os.path.exists(dst):
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+        if src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime):
+            return False
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst)
+    write_precompressed(dst)
+    return True
+
+
+def export_thumbnails(book: Cookbook, target: str, outputs: Set[str], workers: int = 0) -> int:
+    """
+    Create the thumbnails the listings link to and copy them to the target folder. Adds the paths of
+    the copies to `outputs`. Returns the number of copied files.
+    """
+    if not thumbnails:
+        return 0
+
+    _, failures = thumbnails.generate_all(book.images, workers)
+    failed = set()
+    for image, error in failures:
+        print(f"Could not create thumbnail of {image}: {error}")
+        failed.add(image)
+
+    copied = 0
+    for image in sorted(book.images):
+        for width in thumbnails.widths:
+            # without a thumbnail the original stands in for it, browsers recognize the image type either way
+            src = os.path.join(book.folder, "images", image) if image in failed else thumbnails.cache_path(image, width)
+            dst = os.path.join(target, thumbnails.url(image, width))
+            copied += copy_file(src, dst)
+            outputs.add(dst)
+    return copied
+
+
+def remove_stale(target: str, previous: Set[str], current: Set[str]) -> int:
+    """
+    Delete the files a previous export wrote that this one did not, e.g. the pages of removed recipes,
+    along with their compressed copies and the folders left empty. Returns the number of deleted files.
+    """
+    removed = 0
+    for file in sorted(previous - current):
+        path = os.path.join(target, file)
+        if not os.path.exists(path):
+            continue
+        for variant in [path] + [path + suffix for suffix in FILE_SUFFIXES.values()]:
+            if os.path.exists(variant):
+                os.remove(variant)
+        removed += 1
+
+        folder = os.path.dirname(path)
+        while os.path.abspath(folder) != os.path.abspath(target) and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+    return removed
+
+
+def export(target: str, workers: int = 0, common_tags: int = 4):
+    """
+    Render every page of the cookbook to static files in the target folder, along with the static
+    assets, recipe images and their thumbnails. Pages whose inputs have not changed since the last export are
+    skipped, files of the last export that this one no longer has are deleted.
+    """
+    create_app()
+    from .main import book
+
+    # facets and further pages of a listing link to searches the export does not render,
+    # so listings are exported whole and without facets
+    app.config["FACET_COUNT"] = 0
+    app.config["LISTING_PAGE_SIZE"] = 0
+    # there is no suggest endpoint to ask for completions
+    app.config["SEARCH_SUGGESTIONS"] = False
+
+    os.makedirs(target, exist_ok=True)
+    manifest_path = os.path.join(target, MANIFEST)
+
+    # pages by fingerprint, and the other files written by the export
+    manifest: Dict[str, object] = {"pages": {}, "files": []}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        if "pages" not in manifest:
+            manifest = {"pages": manifest, "files": []}  # written before the export kept track of its files
+
+    all_pages = pages(book, common_tags)
+    todo = []
+    new_pages = {}
+    for url, file, page_fingerprint in all_pages:
+        new_pages[file] = page_fingerprint
+        if manifest["pages"].get(file) != page_fingerprint or not os.path.exists(os.path.join(target, file)):
+            todo.append((url, os.path.join(target, file)))
+
+    urls = [url for url, _ in todo]
+    targets = [file for _, file in todo]
+    if workers > 1 and len(todo) > 1:
+        # forked workers share the already loaded cookbook with this process
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            statuses = list(executor.map(render_page, urls, targets, chunksize=8))
+    else:
+        statuses = list(map(render_page, urls, targets))
+
+    for (url, file), status in zip(todo, statuses):
+        if status != 200:
+            print(f"Failed to render {url}: status {status}")
+            del new_pages[os.path.relpath(file, target).replace(os.sep, "/")]
+
+    outputs: Set[str] = set()
+    copied = sync_tree(get_data_path("static"), os.path.join(target, "static"), outputs)
+    copied += sync_tree(os.path.join(book.folder, "images"), os.path.join(target, "images"), outputs)
+    copied += export_thumbnails(book, target, outputs, workers)
+    files = {os.path.relpath(path, target).replace(os.sep, "/") for path in outputs}
+
+    removed = remove_stale(target, set(manifest["pages"]) | set(manifest["files"]), set(new_pages) | files)
+
+    with open(manifest_path, 'w') as file:
+        json.dump({"pages": new_pages, "files": sorted(files)}, file, indent=2, sort_keys=True)
+
+    print(f"Exported {len(todo)} pages ({len(all_pages) - len(todo)} unchanged) "
+          f"and {copied} files to {target}, removed {removed} stale files")
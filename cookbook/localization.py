@@ -1,24 +1,47 @@
 import os
+from typing import Dict, Tuple
 from ruamel.yaml import YAML
 
 from .common import get_data_path
 
 yaml = YAML()
 
-LOC_FILES = {}
+# only the names of the localization files are read at import, each file is parsed on first use
+LOC_PATHS = {}
 for file in os.listdir(get_data_path("localization")):
     if os.path.splitext(file)[1] == '.yml':
-        lang = os.path.splitext(file)[0]
-        print(f"Loading localization file for {lang}")
-        loc_file_path = os.path.join(get_data_path("localization"), file)
-        with open(loc_file_path) as loc_file:
-            LOC_FILES[lang] = yaml.load(loc_file)
+        LOC_PATHS[os.path.splitext(file)[0]] = os.path.join(get_data_path("localization"), file)
+
+LOC_FILES: Dict[str, Dict[str, str]] = {}
+TABLES: Dict[Tuple[str, ...], Dict[str, str]] = {}
+
+
+def loc_file(lang: str) -> Dict[str, str]:
+    if lang not in LOC_FILES:
+        # concurrent first uses may both parse the file, which is harmless
+        with open(LOC_PATHS[lang], encoding="utf-8") as file:
+            LOC_FILES[lang] = dict(yaml.load(file) or {})
+    return LOC_FILES[lang]
 
 def is_localized(loc_id: str, lang: str):
-    return lang in LOC_FILES and loc_id in LOC_FILES[lang]
+    return lang in LOC_PATHS and loc_id in loc_file(lang)
 
 def localize(loc_id: str, lang: str):
     if is_localized(loc_id, lang):
-        return LOC_FILES[lang][loc_id]
+        return loc_file(lang)[loc_id]
+
+    return loc_id
 
-    return loc_id
\ No newline at end of file
+def table(*langs: str) -> Dict[str, str]:
+    """
+    All localized strings for the first of the languages that has them, e.g. table(lang, default, 'en').
+    Languages without a localization file are skipped, so there is one merged table per distinct chain
+    of existing files.
+    """
+    chain = tuple(dict.fromkeys(lang for lang in langs if lang in LOC_PATHS))
+    if chain not in TABLES:
+        merged = {}
+        for lang in reversed(chain):
+            merged.update(loc_file(lang))
+        TABLES[chain] = merged
+    return TABLES[chain]
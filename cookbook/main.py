@@ -1,18 +1,33 @@
 import argparse
 
+import atexit
+import contextlib
 import flask
 from flask import Flask, request, g
+import functools
 import os
 import os.path
 import sys
 import json
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
 
+from . import compression
 from . import localization
 from . import formatting
 from . import searchparser
+from . import thumbnails as thumbnailer
+from .cache import LRUCache, CachedPage
 from .common import get_data_path
-from .cookbook.cookbook import Cookbook
+from .metrics import Registry
+from .profiling import Profiler, Timings
+from .cookbook.cookbook import Cookbook, SUGGESTION_LIMIT
 from .cookbook.errors import LoadException
+from .cookbook.snapshot import load_shared
+from .watch import CookbookWatcher
 
 
 app = Flask(__name__, template_folder=get_data_path("Templates"))
@@ -38,9 +53,9 @@ def lang():
 def add_lang_to_route(endpoint, values):
     if 'lang' in values:
         return
-    print(f"Current language is {lang()}")
     if app.url_map.is_endpoint_expecting(endpoint, 'lang'):
         values['lang'] = lang()
+        app.logger.debug("Adding language %s to url for %s", values['lang'], endpoint)
 
 
 @app.url_value_preprocessor
@@ -54,6 +69,88 @@ def pull_lang(endpoint, values):
         g.response.set_cookie('lang', lang_code)
 
 
+@app.before_request
+def ensure_loaded():
+    # for servers that take `app` from this module instead of calling create_app
+    if book is None:
+        create_app()
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if app.config["SERVER_TIMING"]:
+        g.timings = Timings()
+    if profiler and request.endpoint != "profile_next":
+        g.profile = profiler.start(profiler.authorized(request.headers.get("X-Profile-Token")))
+
+
+def span(name: str):
+    """
+    Time a phase of the request for the Server-Timing header, if enabled
+    """
+    timings = g.get("timings")
+    return timings.span(name) if timings else NO_SPAN
+
+
+NO_SPAN = contextlib.nullcontext()
+
+
+@app.before_request
+def watch_cookbook():
+    if not watcher:
+        return
+
+    start = time.perf_counter()
+    errors = watcher.poll()
+    if errors is not None:
+        refresh_duration.observe(time.perf_counter() - start)
+        load_errors.inc(amount=len(errors))
+    if errors:
+        print_load_errors(errors, raise_causes=False)
+
+    watcher.lock.acquire_read()
+    g.holds_cookbook_lock = True
+
+
+@app.teardown_request
+def release_cookbook(exc):
+    if g.pop("holds_cookbook_lock", False):
+        watcher.lock.release_read()
+
+
+@app.after_request
+def remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.after_request
+def add_server_timing(response):
+    timings = g.get("timings")
+    if timings:
+        # phases of streamed listings that run after the headers are sent are not included
+        response.headers["Server-Timing"] = timings.header(time.perf_counter() - g.request_start)
+    return response
+
+
+@app.teardown_request
+def record_request(exc):
+    # streamed responses are torn down once the stream is finished, so they are timed in full
+    start = g.pop("request_start", None)
+    if start is None:
+        return
+    endpoint = request.endpoint or "none"
+    status = 500 if exc else g.pop("response_status", 500)
+    request_duration.observe(time.perf_counter() - start, endpoint)
+    requests_total.inc(endpoint, str(status))
+    metrics.flush()
+
+    profile = g.pop("profile", None)
+    if profile:
+        app.logger.info("Profile of %s written to %s", request.path, profiler.finish(profile, endpoint))
+
+
 @app.context_processor
 def inject_language_stuff():
     return dict(active_lang=lang(), localize=localize)
@@ -67,55 +164,203 @@ def inject_site_info():
         # (i.e. the first segment is expected to be a domain name, not the first path segment),
         # so we turn the default application root of "/" into an empty string for our templates
         root = ""
-    return dict(site_name=app.config["SITE_NAME"], base_url=app.config["BASE_URL"], root=root)
+    return dict(site_name=app.config["SITE_NAME"], base_url=app.config["BASE_URL"], root=root,
+                search_suggestions=app.config["SEARCH_SUGGESTIONS"])
 
 @app.context_processor
 def inject_cookbook():
-    return dict(book=book)
+    return dict(book=book, thumbnail_srcset=thumbnail_srcset)
+
+
+def thumbnail_srcset(recipe):
+    """
+    The thumbnails of the recipe's image as (path, width), smallest first, or nothing without thumbnails
+    """
+    image = book.image_path(recipe)
+    if not thumbnails or not image.startswith("images/"):
+        return []
+    return [(thumbnails.url(image[len("images/"):], width), width) for width in thumbnails.widths]
+
+
+def cached_page(view):
+    """
+    Serve the rendered output of a view from the page cache, keyed by endpoint, language and arguments.
+    Responses carry an ETag and Last-Modified derived from the cookbook generation and answer conditional
+    requests with 304 Not Modified.
+    """
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        page_cache.sync(book.generation)
+        key = (request.endpoint, lang(), tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))))
+
+        page = page_cache.get(key)
+        if page is None:
+            response = view(**kwargs)
+            if response is not g.response or response.status_code != 200 or response.is_streamed:
+                return response  # redirects, errors and streamed listings are not cached
+            page = CachedPage.from_body(response.get_data(), response.mimetype)
+            page_cache.put(key, page)
+
+        response = g.response
+        response.mimetype = page.mimetype
+        encoded = None
+        # a page that is not kept is sent as it is: compressing it for a single response costs more than it saves
+        encoding = compression.negotiate(request.accept_encodings, compression.ENCODINGS) if page_cache.maxsize > 0 else None
+        if encoding:
+            with span("compress"):
+                encoded = page.encode(encoding)
+        if encoded is not None:
+            response.set_data(encoded)
+            response.headers["Content-Encoding"] = encoding
+            response.set_etag(f"{page.etag}-{encoding}")
+        else:
+            response.set_data(page.body)
+            response.set_etag(page.etag)
+        response.vary.add("Accept-Encoding")
+        response.last_modified = datetime.fromtimestamp(int(book.last_modified), timezone.utc)
+        response.headers["Cache-Control"] = app.config["CACHE_CONTROL"]
+        response.vary.add("Cookie")  # routes without a language prefix take it from the cookie
+        return response.make_conditional(request)
+
+    return wrapper
 
 
 @app.route('/')
 @app.route('/<lang>/')
+@cached_page
 def index():
-    g.response.data = flask.render_template('index.jinja2', langs=book.by_language.keys(), most_common_tags=book.most_common_tags(lang()))
+    with span("render"):
+        g.response.data = flask.render_template('index.jinja2', langs=book.by_language.keys(), most_common_tags=book.most_common_tags(lang()))
     return g.response
 
 
 @app.route('/search')
 @app.route('/<lang>/search')
+@cached_page
 def search():
     query_str = request.args["query"]
     if not query_str:
         return flask.redirect('/all')
 
-    query = searchparser.Parser(query_str).parse()
+    with span("parse"):
+        query = searchparser.Parser(query_str).parse()
+
+    if "explain" in request.args:
+        # the evaluation plan of the query with the number of recipes at each step, for debugging
+        g.response.set_data(query.explain(book, lang()))
+        g.response.mimetype = "text/plain"
+        return g.response
+
+    results, facets = search_recipes(query, lang())
+    return render_listing(results, query=query_str, facets=refinements(facets, query))
+
+
+@app.route("/suggest")
+@app.route("/<lang>/suggest")
+def suggest():
+    """
+    Completions for the search bar as JSON: the recipe names, tags and ingredients with a word starting with
+    the `q` argument, most common first, each with the query searching for it
+    """
+    limit = max(0, min(request.args.get("limit", SUGGESTION_LIMIT, type=int), SUGGESTION_LIMIT))
+    suggestions = [dict(text=text, kind=kind, count=count, query=str(searchparser.Parser.FIELDS[kind](text)))
+                   for kind, text, count in book.suggestions(lang(), request.args.get("q", ""), limit)]
+
+    g.response.set_data(json.dumps(suggestions))
+    g.response.mimetype = "application/json"
+    g.response.headers["Cache-Control"] = app.config["CACHE_CONTROL"]
+    return g.response
+
+
+def search_recipes(query: searchparser.Filter, lang: str):
+    """
+    The recipes matching the query in listing order, and the most common tags among them (see Cookbook.facets)
+    """
+    key = (lang, query.key())
+
+    search_cache.sync(book.generation)
+    cached = search_cache.get(key)
+    if cached is None:
+        with span("filter"):
+            bits = query.bits(book, lang)
+        with span("sort"):
+            results = book.in_listing_order(lang, set(book.recipes_in(lang, bits)))
+        with span("facets"):
+            facets = listing_facets(lang, bits)
+        # the recipes themselves rather than their ids, several files may define the same id and language
+        search_cache.put(key, (results, facets))
+    else:
+        results, facets = cached
+
+    search_results.observe(len(results))
+    return results, facets
+
+
+def listing_facets(lang: str, bits: int):
+    count = int(app.config["FACET_COUNT"])
+    return book.facets(lang, bits, count) if count > 0 else []
+
+
+def refinements(facets, query: searchparser.Filter = None):
+    """
+    Links narrowing the results down to one of the facets: (tag, number of recipes, refined query)
+    """
+    links = []
+    for tag, count in facets:
+        refined = searchparser.Query()
+        if query is not None:
+            refined.add_filter(query)
+        refined.add_filter(searchparser.TagFilter(tag))
+        links.append((tag, count, str(refined)))
+    return links
+
+
+def paginate(results):
+    """
+    Cut the page selected by the `cursor` (number of results to skip) and `limit` arguments out of the
+    results. Returns the template context for the listing, including the query strings of the neighbouring pages.
+    """
+    total = len(results)
+    cursor = max(0, request.args.get("cursor", 0, type=int))
+    limit = request.args.get("limit", int(app.config["LISTING_PAGE_SIZE"]), type=int)
+
+    def page_args(page_cursor):
+        return urlencode({**request.args, "cursor": page_cursor})
 
-    results = set()
-    for recipe in book.by_language[lang()]:
-        if query.passes(recipe):
-            results.add(recipe)
+    if limit <= 0:
+        return dict(results=results[cursor:], total=total, cursor=cursor,
+                    prev_args=page_args(0) if cursor else None, next_args=None)
 
-    results = sorted(results, key=lambda r: r.metadata.name)
+    return dict(results=results[cursor:cursor + limit], total=total, cursor=cursor,
+                prev_args=page_args(max(0, cursor - limit)) if cursor else None,
+                next_args=page_args(cursor + limit) if cursor + limit < total else None)
 
-    g.response.data = flask.render_template('listing.jinja2', results=results, query=query_str)
+
+def render_listing(results, **context):
+    if app.config["STREAM_LISTINGS"]:
+        # send the page as it renders, so the first results arrive before the last ones are done
+        g.response.response = flask.stream_template('listing.jinja2', **paginate(results), **context)
+    else:
+        with span("render"):
+            g.response.data = flask.render_template('listing.jinja2', **paginate(results), **context)
     return g.response
 
 
 @app.route("/all")
 @app.route("/<lang>/all")
+@cached_page
 def all():
-    all_except_hidden = filter(lambda recipe: not recipe.metadata.hide_from_all, book.by_language[lang()])
-    results = sorted(all_except_hidden, key=lambda r: r.metadata.name)
-    g.response.data = flask.render_template('listing.jinja2', results=results)
-    return g.response
+    recipes = book.listing(lang())
+    facets = listing_facets(lang(), book.bits_of(lang(), recipes))
+    return render_listing(recipes, facets=refinements(facets))
 
 
 @app.route("/recipe/<recipe_id>")
 @app.route("/<lang>/recipe/<recipe_id>")
+@cached_page
 def recipe(recipe_id: str):
     if recipe_id not in book.by_id:
-        g.response.data = flask.render_template('listing.jinja2', results=[])
-        return g.response
+        return render_listing([])
 
     recipe_trans = book.by_id[recipe_id]
     if lang() in recipe_trans.translations:
@@ -125,15 +370,63 @@ def recipe(recipe_id: str):
     else:
         recipe = list(recipe_trans.translations.values())[0]
 
-    g.response.data = flask.render_template('recipe.jinja2', recipe=recipe, recipe_trans=recipe_trans)
+    with span("render"):
+        g.response.data = flask.render_template('recipe.jinja2', recipe=recipe, recipe_trans=recipe_trans)
     return g.response
 
 
+def precompressed_static(filename):
+    static_file = static_files.get(filename)
+    if not static_file:
+        return app.send_static_file(filename)
+
+    encoding = compression.negotiate(request.accept_encodings, static_file.encoded) or "identity"
+    response = flask.Response(static_file.encoded[encoding], mimetype=static_file.mimetype)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.set_etag(f"{static_file.etag}-{encoding}")
+    response.last_modified = datetime.fromtimestamp(int(static_file.mtime), timezone.utc)
+    response.vary.add("Accept-Encoding")
+    return response.make_conditional(request)
+
+
+# static assets are compressed once at startup rather than on every request
+static_files = compression.precompress_folder(app.static_folder)
+app.view_functions["static"] = precompressed_static
+
+
 @app.route("/images/<path:path>")
 def images(path):
     return flask.send_from_directory(os.path.join(app.config["COOKBOOK_LOCATION"], "images"), path)
 
 
+def thumbnail(width: int, name: str):
+    image = thumbnails.source(name)
+    if width not in thumbnails.widths or image not in book.images:
+        flask.abort(404)
+    try:
+        path = thumbnails.get(image, width)
+    except Exception as e:  # unreadable or unsupported image
+        app.logger.warning("Could not create thumbnail of %s: %s", image, e)
+        return images(image)
+    return flask.send_file(path, mimetype=thumbnails.mimetype, conditional=True)
+
+
+def metrics_page():
+    return flask.Response(metrics.render(), content_type=metrics.content_type)
+
+
+def profile_next():
+    """
+    Profile the next `count` requests handled by this worker process
+    """
+    if not profiler.authorized(request.headers.get("X-Profile-Token")):
+        flask.abort(403)
+    count = request.args.get("count", 1, type=int)
+    profiler.profile_next(count)
+    return f"Profiling the next {count} requests of process {os.getpid()}, writing to {profiler.folder}\n"
+
+
 @app.template_filter()
 def format_num(value):
     if not value:
@@ -168,24 +461,35 @@ def mapnone(xs, val):
 
 
 def localize(string):
-    if localization.is_localized(string, lang()):
-        return localization.localize(string, lang())
-
-    if localization.is_localized(string, app.config['DEFAULT_LANG']):
-        return localization.localize(string, app.config['DEFAULT_LANG'])
-
-    return localization.localize(string, 'en')
+    return localization.table(lang(), app.config['DEFAULT_LANG'], 'en').get(string, string)
 
 
 if "COOKBOOK_LOCATION" not in app.config:
     raise Exception("No COOKBOOK_LOCATION in config, was a config file provided? - Unable to continue.")
 
-book, errors = Cookbook.load_folder(app.config["COOKBOOK_LOCATION"])
-print(f"Cookbook: {len(book.by_id)} recipes loaded (path: {app.config['COOKBOOK_LOCATION']})")
-for language, collection in book.by_language.items():
-    print(f"- {language}: {len(collection)}")
-
-if errors:
+metrics = Registry(app.config.get("METRICS_MULTIPROCESS_DIR"))
+requests_total = metrics.counter("cookbook_requests_total", "Requests by endpoint and status code",
+                                 ["endpoint", "status"])
+request_duration = metrics.histogram("cookbook_request_duration_seconds", "Time to answer a request by endpoint",
+                                     ["endpoint"])
+load_duration = metrics.gauge("cookbook_load_duration_seconds", "Time taken to load the cookbook at startup")
+refresh_duration = metrics.histogram("cookbook_refresh_duration_seconds",
+                                     "Time taken to check the recipe folder for changes and reload them")
+load_errors = metrics.counter("cookbook_load_errors_total", "Errors and warnings reported while loading recipes")
+search_results = metrics.histogram("cookbook_search_results", "Number of recipes found per search",
+                                   buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+metrics.callback("cookbook_recipes", "Loaded recipes by language", ["lang"],
+                 lambda: {(language,): len(recipes) for language, recipes in book.by_language.items()})
+metrics.callback("cookbook_cache_hits_total", "Cache lookups that found an entry", ["cache"],
+                 lambda: {("page",): page_cache.hits, ("search",): search_cache.hits}, type="counter")
+metrics.callback("cookbook_cache_misses_total", "Cache lookups that found no entry", ["cache"],
+                 lambda: {("page",): page_cache.misses, ("search",): search_cache.misses}, type="counter")
+metrics.callback("cookbook_cache_hit_ratio", "Share of cache lookups that found an entry, in this process", ["cache"],
+                 lambda: {("page",): page_cache.hit_ratio(), ("search",): search_cache.hit_ratio()})
+atexit.register(metrics.close)
+
+
+def print_load_errors(errors, raise_causes=True):
     print("The following errors occurred while trying to load recipes (These recipes may be ignored):\n")
     for error in errors:
         print(f"{error.args[0]}")
@@ -193,17 +497,70 @@ if errors:
             for note in error.context:
                 print(f"  {note}")
             if error.cause:
-                raise error.cause
+                if raise_causes:
+                    raise error.cause
+                print(f"  caused by {type(error.cause).__name__}: {error.cause}")
         print()
 
-if not book.by_id:
-    print("I was unable to load any recipes whatsoever.")
 
-if "DEFAULT_LANG" not in app.config:
-    if not book.by_language:
-        app.config["DEFAULT_LANG"] = "en"
-    else:
-        app.config["DEFAULT_LANG"] = max(book.by_language.keys(), key=(lambda k: len(book.by_language[k])))
+if "SEARCH_CACHE_SIZE" not in app.config:
+    app.config["SEARCH_CACHE_SIZE"] = 256
+
+search_cache = LRUCache(int(app.config["SEARCH_CACHE_SIZE"]))
+
+if "PAGE_CACHE_SIZE" not in app.config:
+    app.config["PAGE_CACHE_SIZE"] = 256
+
+if "LISTING_PAGE_SIZE" not in app.config:
+    app.config["LISTING_PAGE_SIZE"] = 0
+
+if "STREAM_LISTINGS" not in app.config:
+    app.config["STREAM_LISTINGS"] = False
+
+if "FACET_COUNT" not in app.config:
+    app.config["FACET_COUNT"] = 8
+
+if "SEARCH_SUGGESTIONS" not in app.config:
+    app.config["SEARCH_SUGGESTIONS"] = True
+
+if "CACHE_CONTROL" not in app.config:
+    app.config["CACHE_CONTROL"] = "no-cache"
+
+page_cache = LRUCache(int(app.config["PAGE_CACHE_SIZE"]))
+
+if app.config.get("METRICS_PATH"):
+    app.add_url_rule(app.config["METRICS_PATH"], "metrics", metrics_page)
+
+if "SERVER_TIMING" not in app.config:
+    app.config["SERVER_TIMING"] = False
+
+if app.config.get("PROFILE_TOKEN"):
+    profiler = Profiler(app.config["PROFILE_TOKEN"],
+                        app.config.get("PROFILE_LOCATION", os.path.join(tempfile.gettempdir(), "cookbook-profiles")))
+    app.add_url_rule("/_profile", "profile_next", profile_next, methods=["POST"])
+else:
+    profiler = None
+
+if "THUMBNAIL_WIDTHS" not in app.config:
+    app.config["THUMBNAIL_WIDTHS"] = [400, 800]
+elif isinstance(app.config["THUMBNAIL_WIDTHS"], int):
+    app.config["THUMBNAIL_WIDTHS"] = [app.config["THUMBNAIL_WIDTHS"]]
+
+if "THUMBNAIL_FORMAT" not in app.config:
+    app.config["THUMBNAIL_FORMAT"] = "webp"
+
+if "THUMBNAIL_LOCATION" not in app.config:
+    app.config["THUMBNAIL_LOCATION"] = os.path.join(tempfile.gettempdir(), "cookbook-thumbnails")
+
+if thumbnailer.available() and app.config["THUMBNAIL_WIDTHS"]:
+    thumbnails = thumbnailer.Thumbnails(os.path.join(app.config["COOKBOOK_LOCATION"], "images"),
+                                        app.config["THUMBNAIL_LOCATION"],
+                                        [int(width) for width in app.config["THUMBNAIL_WIDTHS"]],
+                                        app.config["THUMBNAIL_FORMAT"],
+                                        int(app.config.get("THUMBNAIL_QUALITY", 80)))
+    app.add_url_rule("/thumbnails/<int:width>/<path:name>", "thumbnail", thumbnail)
+else:
+    thumbnails = None
 
 if "SITE_NAME" not in app.config:
     app.config["SITE_NAME"] = "Cookbook"
@@ -211,3 +568,63 @@ if "SITE_NAME" not in app.config:
 if "BASE_URL" not in app.config:
     raise Exception("No BASE_URL in app config")
 
+book = None
+watcher = None
+load_lock = threading.Lock()
+
+
+def create_app() -> Flask:
+    """
+    Load the cookbook on the first call and return the application. Loading is not done while this module
+    is imported: with LOAD_WORKERS, the process pool pickles its calls in a helper thread, which would wait
+    forever for the importing thread to release the import lock of the package.
+    """
+    with load_lock:
+        if book is None:
+            load_cookbook()
+    return app
+
+
+def load_cookbook():
+    global book, watcher
+
+    load_start = time.perf_counter()
+    if app.config.get("SNAPSHOT_LOCATION"):
+        loaded, errors = load_shared(app.config["SNAPSHOT_LOCATION"], app.config["COOKBOOK_LOCATION"],
+                                     int(app.config.get("LOAD_WORKERS", 0)), app.config.get("RECIPE_CACHE_LOCATION"))
+    else:
+        loaded, errors = Cookbook.load_folder(app.config["COOKBOOK_LOCATION"],
+                                              int(app.config.get("LOAD_WORKERS", 0)),
+                                              app.config.get("RECIPE_CACHE_LOCATION"))
+    load_duration.set(time.perf_counter() - load_start)
+    load_errors.inc(amount=len(errors))
+    print(f"Cookbook: {len(loaded.by_id)} recipes loaded (path: {app.config['COOKBOOK_LOCATION']})")
+    for language, collection in loaded.by_language.items():
+        print(f"- {language}: {len(collection)}")
+
+    if errors:
+        print_load_errors(errors)
+
+    if not loaded.by_id:
+        print("I was unable to load any recipes whatsoever.")
+
+    if "DEFAULT_LANG" not in app.config:
+        if not loaded.by_language:
+            app.config["DEFAULT_LANG"] = "en"
+        else:
+            app.config["DEFAULT_LANG"] = max(loaded.by_language.keys(), key=(lambda k: len(loaded.by_language[k])))
+
+    # merge the localizations of the languages we serve now, other languages are merged on first use
+    for language in loaded.by_language:
+        localization.table(language, app.config["DEFAULT_LANG"], 'en')
+
+    if app.config.get("WATCH_INTERVAL"):
+        watcher = CookbookWatcher(loaded, float(app.config["WATCH_INTERVAL"]))
+
+    if thumbnails and app.config.get("PREGENERATE_THUMBNAILS"):
+        created, failures = thumbnails.generate_all(loaded.images, int(app.config.get("LOAD_WORKERS", 0)))
+        print(f"Created {created} thumbnails in {app.config['THUMBNAIL_LOCATION']}")
+        for image, error in failures:
+            print(f"Could not create thumbnail of {image}: {error}")
+
+    book = loaded
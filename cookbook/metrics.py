@@ -0,0 +1,290 @@
+import bisect
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def process_alive(pid: int) -> bool:
+    if os.name != "posix":
+        return True  # os.kill would terminate the process rather than probe it
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, but belongs to another user
+    return True
+
+
+def sample_line(name: str, label_names: Sequence[str], label_values: Sequence, value: float) -> str:
+    if not label_names:
+        return f"{name} {format_value(value)}"
+    labels = ",".join(f'{label}="{escape(label_value)}"' for label, label_value in zip(label_names, label_values))
+    return f"{name}{{{labels}}} {format_value(value)}"
+
+
+class Metric:
+    """
+    A metric family with a fixed set of label names. Values are kept per combination of label values
+    and updated under a lock, so one instance can be shared by all request threads.
+    """
+    type = "untyped"
+    # counters and histograms are added up across worker processes, gauges are reported by the
+    # process answering the scrape
+    shared = False
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {escape(self.help)}", f"# TYPE {self.name} {self.type}"]
+
+    def snapshot(self) -> Dict[Labels, object]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, values: Dict[Labels, object]) -> List[str]:
+        return [sample_line(self.name, self.labels, labels, value) for labels, value in sorted(values.items())]
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+
+class Counter(Metric):
+    type = "counter"
+    shared = True
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class CallbackMetric(Metric):
+    """
+    A metric whose values are read from the application when it is collected, e.g. the hit counts
+    a cache keeps anyway. `collect` returns the values by label values.
+    """
+    def __init__(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[Labels, float]],
+                 type: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.type = type
+        self.shared = type == "counter"
+
+    def snapshot(self) -> Dict[Labels, object]:
+        return {tuple(str(label) for label in labels): value for labels, value in self.collect().items()}
+
+
+class Histogram(Metric):
+    """
+    Counts observations into buckets with the given upper bounds. The per-label values are
+    [count per bucket (not cumulative, the last one is +Inf), sum of observations].
+    """
+    type = "histogram"
+    shared = True
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][bucket] += 1
+            counts[1] += value
+
+    def snapshot(self) -> Dict[Labels, object]:
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+    def render(self, values: Dict[Labels, object]) -> List[str]:
+        lines = []
+        bucket_labels = self.labels + ("le",)
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(sample_line(f"{self.name}_bucket", bucket_labels, labels + (format_value(bound),),
+                                         cumulative))
+            lines.append(sample_line(f"{self.name}_sum", self.labels, labels, total))
+            lines.append(sample_line(f"{self.name}_count", self.labels, labels, cumulative))
+        return lines
+
+    @staticmethod
+    def merge(a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+
+class Registry:
+    """
+    The metrics of the application, rendered in the Prometheus text format. With a multiprocess
+    folder, every process writes its counters and histograms to its own file there (see `flush`) and
+    the scraped process adds up the files of all running processes. A process removes its file when
+    it exits, and the files of processes that died without doing so are removed by the next process
+    to start writing.
+    """
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, multiprocess_folder: Optional[str] = None, flush_interval: float = 1.0):
+        self.metrics: List[Metric] = []
+        self.multiprocess_folder = multiprocess_folder
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        self._file: Optional[str] = None
+        self._file_pid: Optional[int] = None
+        if multiprocess_folder:
+            os.makedirs(multiprocess_folder, exist_ok=True)
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.add(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[Labels, float]],
+                 type: str = "gauge") -> CallbackMetric:
+        return self.add(CallbackMetric(name, help, labels, collect, type))
+
+    def process_file(self) -> str:
+        # a forked worker starts its own file, named after its pid and start time so that a later
+        # process reusing the pid does not overwrite (and thereby decrease) the counts of this one
+        if self._file_pid != os.getpid():
+            self._file_pid = os.getpid()
+            self._file = os.path.join(self.multiprocess_folder, f"metrics-{os.getpid()}-{time.time_ns()}.json")
+            self.remove_stale_files()
+        return self._file
+
+    def remove_stale_files(self):
+        """
+        Remove the files of processes that are no longer running
+        """
+        for path in glob.glob(os.path.join(self.multiprocess_folder, "metrics-*.json")):
+            try:
+                pid = int(os.path.basename(path).split("-")[1])
+            except (IndexError, ValueError):
+                continue
+            if not process_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # already removed by another process
+
+    def close(self):
+        """
+        Remove this process's file, its counts leave the totals with it. Registered to run at exit.
+        """
+        if not self.multiprocess_folder or self._file_pid != os.getpid():
+            return
+        with self._flush_lock:
+            try:
+                os.remove(self._file)
+            except OSError:
+                pass
+            self._file_pid = None
+
+    def flush(self, force: bool = False):
+        """
+        Write this process's counters and histograms to its file in the multiprocess folder, at most
+        once per flush interval unless forced. Does nothing without a multiprocess folder.
+        """
+        if not self.multiprocess_folder:
+            return
+        if not force and time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        if not self._flush_lock.acquire(blocking=force):
+            return  # another thread is already writing
+
+        try:
+            self._last_flush = time.monotonic()
+            data = {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+                    for metric in self.metrics if metric.shared}
+            path = self.process_file()
+            fd, tmp_path = tempfile.mkstemp(dir=self.multiprocess_folder, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as file:
+                    json.dump(data, file)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        finally:
+            self._flush_lock.release()
+
+    def collect_shared(self) -> Dict[str, Dict[Labels, object]]:
+        """
+        The counters and histograms of all processes, added up
+        """
+        self.flush(force=True)
+        by_name = {metric.name: metric for metric in self.metrics if metric.shared}
+        result: Dict[str, Dict[Labels, object]] = {name: {} for name in by_name}
+        for path in glob.glob(os.path.join(self.multiprocess_folder, "metrics-*.json")):
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue  # removed or replaced while we were reading it
+            for name, samples in data.items():
+                if name not in by_name:
+                    continue  # written by another version of the application
+                values = result[name]
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    values[labels] = by_name[name].merge(values[labels], value) if labels in values else value
+        return result
+
+    def render(self) -> str:
+        shared = self.collect_shared() if self.multiprocess_folder else {}
+        lines = []
+        for metric in self.metrics:
+            values = shared[metric.name] if metric.name in shared else metric.snapshot()
+            lines += metric.header()
+            lines += metric.render(values)
+        return "\n".join(lines) + "\n"
+
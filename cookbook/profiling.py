@@ -0,0 +1,103 @@
+import cProfile
+import hmac
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class Span:
+    def __init__(self, timings: 'Timings', name: str):
+        self.timings = timings
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+class Timings:
+    """
+    Time spent in the phases of one request, reported to the client in a Server-Timing header.
+    A phase entered several times is reported once with its total time and count.
+    """
+    def __init__(self):
+        self.spans: Dict[str, List[float]] = {}
+
+    def span(self, name: str) -> Span:
+        return Span(self, name)
+
+    def add(self, name: str, seconds: float):
+        span = self.spans.setdefault(name, [0.0, 0])
+        span[0] += seconds
+        span[1] += 1
+
+    def header(self, total: Optional[float] = None) -> str:
+        entries = []
+        for name, (seconds, count) in self.spans.items():
+            description = f';desc="{count}x"' if count > 1 else ""
+            entries.append(f"{name};dur={seconds * 1000:.3f}{description}")
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+class Profiler:
+    """
+    Runs cProfile over requests on demand and writes the stats to `folder`, one file per request,
+    to be read with pstats or tools like snakeviz. A request is profiled if it carries the token
+    or if profiling of the next requests was requested through `profile_next`. Only one request
+    per process is profiled at a time, requests arriving meanwhile are served without profiling.
+    """
+    def __init__(self, token: str, folder: str):
+        self.token = token
+        self.folder = folder
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return bool(token) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+    def profile_next(self, count: int):
+        with self._lock:
+            self.pending = max(0, count)
+
+    def start(self, requested: bool) -> Optional[cProfile.Profile]:
+        """
+        Start profiling the current request if it asked for it or one of the pending profiles is due.
+        Returns the running profile, or None.
+        """
+        if not requested and not self.pending:
+            return None
+        if not self._active.acquire(blocking=False):
+            return None  # another request is being profiled
+
+        if not requested:
+            with self._lock:
+                if not self.pending:
+                    self._active.release()
+                    return None
+                self.pending -= 1
+
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, name: str) -> str:
+        """
+        Stop the profile and write its stats to the folder. Returns the path of the written file.
+        """
+        try:
+            profile.disable()
+            os.makedirs(self.folder, exist_ok=True)
+            path = os.path.join(self.folder, f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}"
+                                             f"-{os.getpid()}-{name}.prof")
+            profile.dump_stats(path)
+            return path
+        finally:
+            self._active.release()
@@ -1,7 +1,50 @@
 import abc
-from typing import Optional, List, Callable
+import contextlib
+import math
+import operator
+from typing import Optional, List, Callable, Set, Tuple
 
-from .cookbook.cookbook import Recipe
+from .cookbook.cookbook import Cookbook, Recipe, name_words
+
+
+COMPARISONS = {
+    '=': operator.eq,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+
+def quote(term: str) -> str:
+    if term and not any(c in term for c in " '\"():<>=\\") and term not in ("OR", "AND", "NOT") \
+            and not term.startswith('-'):
+        return term
+    return "'" + term.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+class Plan:
+    """
+    Record of how a query was evaluated: one line per operand with the number of recipes it matched
+    and the number left after combining it with the operands before it, see Filter.explain
+    """
+    def __init__(self):
+        self.lines: List[str] = []
+        self.depth = 0
+
+    def step(self, text: str):
+        self.lines.append("  " * self.depth + text)
+
+    @contextlib.contextmanager
+    def nested(self):
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+
+    def __str__(self):
+        return "\n".join(self.lines)
 
 
 class Filter:
@@ -11,6 +54,63 @@ class Filter:
     def passes(self, recipe: Recipe) -> bool:
         ...
 
+    @abc.abstractmethod
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        """
+        Resolve the filter against the cookbook's per-language indexes, returning the bitset of the
+        recipes for which `passes` would hold (see Cookbook.recipes_in). Compound filters record their
+        steps in the plan, if given.
+        """
+        ...
+
+    def matches(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> Set[Recipe]:
+        """
+        The set of recipes for which `passes` would hold
+        """
+        return set(book.recipes_in(lang, self.bits(book, lang, plan)))
+
+    @abc.abstractmethod
+    def key(self) -> tuple:
+        """
+        Canonical, hashable form of the filter. Filters with equal keys match the same recipes.
+        """
+        ...
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        """
+        Sort key for the operands of a query, so that the cheapest and most selective ones are evaluated
+        first: (cost class, upper bound on the number of matching recipes). Index lookups have cost 0.
+        """
+        return 1, len(book.by_language.get(lang, []))
+
+    def explain(self, book: Cookbook, lang: str) -> str:
+        """
+        The steps taken to evaluate the filter, with the number of recipes at each step
+        """
+        plan = Plan()
+        results = evaluate(self, book, lang, plan)
+        plan.step(f"= {results.bit_count()} recipes")
+        return str(plan)
+
+
+def evaluate(filter: Filter, book: Cookbook, lang: str, plan: Optional[Plan]) -> int:
+    """
+    Resolve an operand of a compound filter, with the steps of compound operands nested in the plan
+    """
+    if plan is None or not isinstance(filter, (Query, AnyOf, NotFilter)):
+        return filter.bits(book, lang)
+
+    plan.step(f"{filter}:")
+    with plan.nested():
+        return filter.bits(book, lang, plan)
+
+
+def all_recipes(book: Cookbook, lang: str, plan: Optional[Plan]) -> int:
+    results = book.all_bits(lang)
+    if plan:
+        plan.step(f"all recipes: {results.bit_count()}")
+    return results
+
 
 class TagFilter(Filter):
     def __init__(self, tag: str):
@@ -19,6 +119,18 @@ class TagFilter(Filter):
     def passes(self, recipe: Recipe) -> bool:
         return recipe.has_tag(self.tag)
 
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        return book.tag_bits(lang, self.tag)
+
+    def key(self) -> tuple:
+        return 'tag', self.tag.lower()
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        return 0, book.tag_bits(lang, self.tag).bit_count()
+
+    def __str__(self):
+        return f"tag:{quote(self.tag)}"
+
     def __repr__(self):
         return f"[Tag: {self.tag}]"
 
@@ -30,10 +142,78 @@ class IngrFilter(Filter):
     def passes(self, recipe: Recipe) -> bool:
         return recipe.has_ingredient(self.ingr)
 
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        return book.ingredient_bits(lang, self.ingr)
+
+    def key(self) -> tuple:
+        return 'ingr', self.ingr.lower()
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        return 0, book.ingredient_bits(lang, self.ingr).bit_count()
+
+    def __str__(self):
+        return f"ingr:{quote(self.ingr)}"
+
     def __repr__(self):
         return f"[Ingredient: {self.ingr}]"
 
 
+class NameFilter(Filter):
+    """
+    Recipes with all words of the term in their name
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.words = {word.lower() for word in name.split()}
+
+    def passes(self, recipe: Recipe) -> bool:
+        return self.words <= name_words(recipe)
+
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        return book.name_word_bits(lang, self.words)
+
+    def key(self) -> tuple:
+        return 'name', tuple(sorted(self.words))
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        postings = book.name_word_bits_by_language.get(lang, {})
+        return 0, min((postings.get(word, 0).bit_count() for word in self.words), default=0)
+
+    def __str__(self):
+        return f"name:{quote(self.name)}"
+
+    def __repr__(self):
+        return f"[Name: {self.name}]"
+
+
+class ServesFilter(Filter):
+    def __init__(self, comparison: str, value: float):
+        self.comparison = comparison
+        self.value = value
+
+    def accepts(self, serves: float) -> bool:
+        return COMPARISONS[self.comparison](serves, self.value)
+
+    def passes(self, recipe: Recipe) -> bool:
+        return self.accepts(recipe.metadata.serves)
+
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        return book.serves_bits(lang, self.accepts)
+
+    def key(self) -> tuple:
+        return 'serves', self.comparison, self.value
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        return 0, book.serves_bits(lang, self.accepts).bit_count()
+
+    def __str__(self):
+        value = int(self.value) if self.value == int(self.value) else self.value
+        return f"serves{self.comparison}{value}"
+
+    def __repr__(self):
+        return f"[Serves: {self.comparison} {self.value}]"
+
+
 class GenericFilter(Filter):
     def __init__(self, term: str):
         self.term = term
@@ -41,16 +221,98 @@ class GenericFilter(Filter):
     def passes(self, recipe: Recipe) -> bool:
         return recipe.has_tag_approx(self.term) or recipe.has_ingredient_approx(self.term) or recipe.has_word_approx(self.term)
 
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        return book.bits_matching_approx(lang, self.term)
+
+    def key(self) -> tuple:
+        return 'generic', self.term.lower()
+
+    def __str__(self):
+        return quote(self.term)
+
     def __repr__(self):
         return f"[Generic: {self.term}]"
 
 
+class NotFilter(Filter):
+    def __init__(self, filter: Filter):
+        self.filter = filter
+
+    def passes(self, recipe: Recipe) -> bool:
+        return not self.filter.passes(recipe)
+
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        results = all_recipes(book, lang, plan)
+        excluded = evaluate(self.filter, book, lang, plan)
+        results &= ~excluded
+        if plan:
+            plan.step(f"NOT {self.filter}: {excluded.bit_count()} matches, {results.bit_count()} left")
+        return results
+
+    def key(self) -> tuple:
+        return 'not', self.filter.key()
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        return self.filter.estimate(book, lang)[0], len(book.by_language.get(lang, []))
+
+    def __str__(self):
+        if isinstance(self.filter, AnyOf) or (isinstance(self.filter, Query) and len(self.filter.filters) > 1):
+            return f"-({self.filter})"
+        return f"-{self.filter}"
+
+    def __repr__(self):
+        return f"[Not: {self.filter!r}]"
+
+
+class AnyOf(Filter):
+    """
+    Recipes matching at least one of the filters
+    """
+    def __init__(self, filters: List[Filter]):
+        self.filters = filters
+
+    def passes(self, recipe: Recipe) -> bool:
+        return any(filter.passes(recipe) for filter in self.filters)
+
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        results = 0
+        for i, filter in enumerate(self.filters):
+            found = evaluate(filter, book, lang, plan)
+            results |= found
+            if plan:
+                plan.step(f"OR {filter}: {found.bit_count()} matches, {results.bit_count()} in total" if i
+                          else f"{filter}: {found.bit_count()} matches")
+        return results
+
+    def key(self) -> tuple:
+        # or-ed together, so neither order nor repetition changes the result
+        return ('or',) + tuple(sorted(set(filter.key() for filter in self.filters), key=repr))
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        estimates = [filter.estimate(book, lang) for filter in self.filters]
+        return max(cost for cost, _ in estimates), min(sum(size for _, size in estimates),
+                                                       len(book.by_language.get(lang, [])))
+
+    def __str__(self):
+        return " OR ".join(f"({filter})" if isinstance(filter, Query) and len(filter.filters) > 1 else str(filter)
+                           for filter in self.filters)
+
+    def __repr__(self):
+        return f"[Any: {' OR '.join(map(repr, self.filters))}]"
+
+
 class Query(Filter):
+    """
+    Recipes matching all of the filters
+    """
     def __init__(self):
         self.filters: List[Filter] = []
 
     def add_filter(self, filter: Filter):
-        self.filters.append(filter)
+        if isinstance(filter, Query):
+            self.filters.extend(filter.filters)  # (a b) c is a b c
+        else:
+            self.filters.append(filter)
 
     def passes(self, recipe: Recipe) -> bool:
         for filter in self.filters:
@@ -58,58 +320,206 @@ class Query(Filter):
                 return False
         return True
 
+    def bits(self, book: Cookbook, lang: str, plan: Optional[Plan] = None) -> int:
+        # intersect the most selective index lookups first, the fuzzy ones last, and then take out the
+        # negated filters; once nothing is left, the remaining filters are skipped
+        by_estimate = lambda filter: filter.estimate(book, lang)
+        included = sorted((filter for filter in self.filters if not isinstance(filter, NotFilter)), key=by_estimate)
+        excluded = sorted((filter.filter for filter in self.filters if isinstance(filter, NotFilter)),
+                          key=lambda filter: (filter.estimate(book, lang)[0], -filter.estimate(book, lang)[1]))
+
+        if included:
+            results = evaluate(included[0], book, lang, plan)
+            if plan:
+                plan.step(f"{included[0]}: {results.bit_count()} matches")
+        else:
+            results = all_recipes(book, lang, plan)
+
+        for filter in included[1:]:
+            if not results:
+                if plan:
+                    plan.step(f"AND {filter}: skipped, nothing left")
+                continue
+            found = evaluate(filter, book, lang, plan)
+            results &= found
+            if plan:
+                plan.step(f"AND {filter}: {found.bit_count()} matches, {results.bit_count()} left")
+
+        for filter in excluded:
+            if not results:
+                if plan:
+                    plan.step(f"AND NOT {filter}: skipped, nothing left")
+                continue
+            found = evaluate(filter, book, lang, plan)
+            results &= ~found
+            if plan:
+                plan.step(f"AND NOT {filter}: {found.bit_count()} matches, {results.bit_count()} left")
+        return results
+
+    def key(self) -> tuple:
+        # filters are and-ed together, so neither order nor repetition changes the result
+        return tuple(sorted(set(filter.key() for filter in self.filters), key=repr))
+
+    def estimate(self, book: Cookbook, lang: str) -> Tuple[int, int]:
+        if not self.filters:
+            return 0, len(book.by_language.get(lang, []))
+        estimates = [filter.estimate(book, lang) for filter in self.filters]
+        return max(cost for cost, _ in estimates), min(size for _, size in estimates)
+
+    def __str__(self):
+        return " ".join(f"({filter})" if isinstance(filter, AnyOf) else str(filter) for filter in self.filters)
+
     def __repr__(self):
         return f"[Query: {' AND '.join(map(repr, self.filters))}]"
 
 
 class Parser:
+    """
+    Parses search queries. Terms are and-ed together; `OR` between terms and `NOT` or `-` before a term
+    combine them otherwise, and parentheses group them. Terms search tags, ingredients and words
+    approximately, unless they are prefixed with a field: `tag:`, `ingr:`, `name:` or a comparison of
+    the servings like `serves>4`. Quote terms with spaces or special characters.
+    """
+    FIELDS = {"tag": TagFilter, "ingr": IngrFilter, "name": NameFilter}
+    # characters that end an unquoted term
+    BREAKS = ["'", '"', ' ', ':', '(', ')', '<', '>', '=']
+
     def __init__(self, inpt: str):
         self.input = inpt
         self.pos = 0
+        self.tokens: List[Tuple[str, str]] = []
+        self.index = 0
 
     def parse(self) -> Query:
+        self.tokens = self.tokenize()
+        self.index = 0
+
         result = Query()
-        next = self.word()
-        while next:
-            if next.lower() == "tag" and self.peek() == ':':
-                self.char()  # skip ':'
-                search_term = self.word()
-                if search_term:
-                    result.add_filter(TagFilter(search_term))
-            elif next.lower() == "ingr" and self.peek() == ':':
-                self.char()  # skip ':'
-                search_term = self.word()
-                if search_term:
-                    result.add_filter(IngrFilter(search_term))
-            else:
-                result.add_filter(GenericFilter(next))
-            next = self.word()
+        while True:
+            filter = self.disjunction()
+            if filter:
+                result.add_filter(filter)
+            if not self.accept(')'):  # unbalanced, ignore it
+                return result
+
+    def disjunction(self) -> Optional[Filter]:
+        operands = [self.conjunction()]
+        while self.accept('word', "OR"):
+            operands.append(self.conjunction())
+
+        filters = []
+        for operand in operands:
+            if len(operand.filters) == 1 and isinstance(operand.filters[0], AnyOf):
+                filters.extend(operand.filters[0].filters)  # a OR (b OR c) is a OR b OR c
+            elif len(operand.filters) == 1:
+                filters.append(operand.filters[0])
+            elif operand.filters:
+                filters.append(operand)
+        if not filters:
+            return None
+        return filters[0] if len(filters) == 1 else AnyOf(filters)
 
+    def conjunction(self) -> Query:
+        result = Query()
+        while self.index < len(self.tokens):
+            kind, text = self.tokens[self.index]
+            if kind == ')' or (kind == 'word' and text == "OR"):
+                break
+            if kind == 'word' and text == "AND":
+                self.index += 1
+                continue
+            filter = self.unary()
+            if filter:
+                result.add_filter(filter)
         return result
 
-    def word(self) -> Optional[str]:
+    def unary(self) -> Optional[Filter]:
+        kind, text = self.tokens[self.index]
+        self.index += 1
+
+        if kind == '-' or (kind == 'word' and text == "NOT"):
+            if self.index >= len(self.tokens):
+                return None
+            filter = self.unary()
+            if filter is None:
+                return None
+            return filter.filter if isinstance(filter, NotFilter) else NotFilter(filter)
+
+        if kind == '(':
+            filter = self.disjunction()
+            self.accept(')')
+            return filter
+
+        if kind == 'word' and text.lower() in self.FIELDS and self.accept('op', ':'):
+            term = self.term()
+            if term is None or not term.split():
+                return None
+            return self.FIELDS[text.lower()](term)
+
+        if kind == 'word' and text.lower() == "serves" and self.next_is('op'):
+            _, comparison = self.tokens[self.index]
+            self.index += 1
+            try:
+                value = float(self.term())
+            except (TypeError, ValueError):
+                return None
+            if not math.isfinite(value):
+                return None
+            return ServesFilter('=' if comparison == ':' else comparison, value)
+
+        if kind in ('word', 'quoted'):
+            return GenericFilter(text)
+
+        return None  # a stray operator
+
+    def term(self) -> Optional[str]:
+        if self.next_is('word') or self.next_is('quoted'):
+            self.index += 1
+            return self.tokens[self.index - 1][1]
+        return None
+
+    def next_is(self, kind: str) -> bool:
+        return self.index < len(self.tokens) and self.tokens[self.index][0] == kind
+
+    def accept(self, kind: str, text: Optional[str] = None) -> bool:
+        if self.next_is(kind) and (text is None or self.tokens[self.index][1] == text):
+            self.index += 1
+            return True
+        return False
+
+    def tokenize(self) -> List[Tuple[str, str]]:
+        """
+        Split the input into (kind, text) tokens of the kinds 'word', 'quoted', 'op' (a colon or comparison),
+        '-', '(' and ')'
+        """
+        tokens = []
         c = self.char()
-        while c == ':' or c == ' ':
+        while c:
+            if c == ' ':
+                pass
+            elif c in '()':
+                tokens.append((c, c))
+            elif c in ':<>=':
+                if c in '<>' and self.peek() == '=':
+                    c += self.char()
+                tokens.append(('op', c))
+            elif c == '-' and self.peek() and self.peek() not in ' )':
+                tokens.append(('-', c))
+            elif c in '"\'':
+                word = self.scan_till([c])
+                self.char()  # skip the closing quote
+                if word:
+                    tokens.append(('quoted', word))
+            else:
+                self.pos -= 1
+                word = self.scan_till(self.BREAKS)
+                if word:
+                    tokens.append(('word', word))
             c = self.char()
+        return tokens
 
-        if not c:
-            return None
-        if c == '"':
-            result = self.scan_till(['"'])
-            self.char()  # skip "
-            return result
-        elif c == "'":
-            result = self.scan_till(["'"])
-            self.char()  # skip '
-            return result
-        else:
-            return c + self.scan_till(["'", '"', ' ', ':'])
-
-    def scan_till(self, end: List[str]) -> Optional[str]:
-        res = self.char()
-        if not res:
-            return None
-
+    def scan_till(self, end: List[str]) -> str:
+        res = ""
         while True:
             c = self.peek()
 
@@ -117,7 +527,7 @@ class Parser:
             if c == '\\':
                 self.skip(1)
                 next = self.char()
-                if not next: return res
+                if not next: return res + c  # a trailing backslash escapes nothing, keep it as it is
                 res += next
             elif c in end:
                 return res
@@ -137,4 +547,4 @@ class Parser:
         return self.input[self.pos]
 
     def skip(self, amnt: int):
-        self.pos += amnt
\ No newline at end of file
+        self.pos += amnt
@@ -0,0 +1,29 @@
+// Offers completions from the suggest endpoint in the search bars, see the data-suggest attribute.
+// Without this script, the search bars work as plain forms.
+document.querySelectorAll("input[data-suggest]").forEach(function (input) {
+    var list = document.getElementById(input.getAttribute("list"));
+    var pending = null;
+
+    input.addEventListener("input", function () {
+        if (pending) {
+            pending.abort();
+        }
+        if (!input.value.trim()) {
+            list.replaceChildren();
+            return;
+        }
+
+        pending = new AbortController();
+        fetch(input.dataset.suggest + "?q=" + encodeURIComponent(input.value), {signal: pending.signal})
+            .then(function (response) { return response.json(); })
+            .then(function (suggestions) {
+                list.replaceChildren.apply(list, suggestions.map(function (suggestion) {
+                    var option = document.createElement("option");
+                    option.value = suggestion.query;
+                    option.label = suggestion.text + " (" + suggestion.count + ")";
+                    return option;
+                }));
+            })
+            .catch(function () {});  // aborted by the next keystroke, or offline
+    });
+});
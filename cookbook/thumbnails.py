@@ -0,0 +1,141 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional, without it listings show the original images
+    Image = None
+
+# format name for the configuration and URLs: (Pillow format, MIME type)
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scale(source: str, target: str, width: int, format: str, quality: int):
+    """
+    Write a copy of the source image scaled down to at most `width` pixels wide. Smaller images
+    keep their size but are re-encoded, which usually still saves most of the bytes of a photo.
+    """
+    with Image.open(source) as image:
+        image.draft("RGB", (width, width))  # lets JPEGs decode at a fraction of their size, in either orientation
+        image = ImageOps.exif_transpose(image)  # phones store photos sideways with a rotation tag
+        image.thumbnail((width, image.height))
+
+        pillow_format = FORMATS[format][0]
+        if pillow_format == "JPEG" and image.mode != "RGB":
+            # JPEG has no transparency, flatten onto white rather than the black behind transparent pixels
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+
+        folder = os.path.dirname(target)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                image.save(file, pillow_format, quality=quality)
+            os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class Thumbnails:
+    """
+    Scaled-down copies of the recipe images for the listings, in each of the configured widths.
+    They are kept in the cache folder under the hash of the source image and the width, so that a
+    replaced image gets new thumbnails while unchanged ones are reused across restarts and by all
+    worker processes. Thumbnails are created on first request, or in bulk with `generate_all`.
+    """
+    def __init__(self, images_folder: str, cache_folder: str, widths: Sequence[int], format: str = "webp",
+                 quality: int = 80):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown thumbnail format {format}, expected one of {', '.join(FORMATS)}")
+        self.images_folder = images_folder
+        self.cache_folder = cache_folder
+        self.widths = tuple(sorted(widths))
+        self.format = format
+        self.quality = quality
+        self.mimetype = FORMATS[format][1]
+        # image name: (mtime, size, digest), so that unchanged images are not hashed on every request
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def url(self, image: str, width: int) -> str:
+        """
+        Path of the thumbnail of the image (a file name in the images folder), relative to the application root
+        """
+        return f"thumbnails/{width}/{image}.{self.format}"
+
+    def source(self, name: str) -> Optional[str]:
+        """
+        The image name of a thumbnail's file name as used in `url`, or None if it is not one of ours
+        """
+        suffix = f".{self.format}"
+        return name[:-len(suffix)] if name.endswith(suffix) else None
+
+    def digest(self, image: str) -> str:
+        stat = os.stat(os.path.join(self.images_folder, image))
+        known = self._digests.get(image)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+        digest = file_digest(os.path.join(self.images_folder, image))
+        self._digests[image] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def cache_path(self, image: str, width: int) -> str:
+        return os.path.join(self.cache_folder, f"{self.digest(image)}-{width}.{self.format}")
+
+    def get(self, image: str, width: int) -> str:
+        """
+        The file of the image's thumbnail, created first if it is not in the cache yet
+        """
+        path = self.cache_path(image, width)
+        if not os.path.exists(path):
+            scale(os.path.join(self.images_folder, image), path, width, self.format, self.quality)
+        return path
+
+    def missing(self, images: Iterable[str]) -> List[Tuple[str, int]]:
+        return [(image, width) for image in sorted(images) for width in self.widths
+                if not os.path.exists(self.cache_path(image, width))]
+
+    def generate_all(self, images: Iterable[str], workers: int = 0) -> (int, List[Tuple[str, str]]):
+        """
+        Create the thumbnails of the images that are not in the cache yet, in a pool of that many
+        threads if there is more than one worker. Pillow releases the GIL while decoding, scaling and
+        encoding, so threads use several cores. Returns the number created and the failures.
+        """
+        todo = self.missing(images)
+        if workers > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(workers) as executor:
+                results = list(executor.map(self._try_get, *zip(*todo)))
+        else:
+            results = [self._try_get(image, width) for image, width in todo]
+
+        failures = [(image, error) for (image, _), error in zip(todo, results) if error is not None]
+        return len(todo) - len(failures), failures
+
+    def _try_get(self, image: str, width: int) -> Optional[str]:
+        try:
+            self.get(image, width)
+            return None
+        except Exception as e:  # unreadable or unsupported image, its listings keep showing the original
+            return f"{type(e).__name__}: {e}"
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import List, Optional
+
+from .cookbook.cookbook import Cookbook
+from .cookbook.errors import LoadException
+
+
+class ReadWriteLock:
+    """
+    Lock allowing any number of concurrent readers or a single writer. Requests hold the read side
+    while they use the cookbook, reloads take the write side while they patch it. Once a writer is
+    waiting, new readers wait as well, so a steady stream of requests cannot hold off a reload.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writing = True
+
+    def release_write(self):
+        with self._cond:
+            self._writing = False
+            self._cond.notify_all()
+
+
+class CookbookWatcher:
+    """
+    Polls the recipe folder for added, changed or removed files at most once every `interval` seconds
+    and patches the cookbook in place. Changed files are parsed in the polling thread, see Cookbook.refresh.
+    """
+    def __init__(self, book: Cookbook, interval: float):
+        self.book = book
+        self.interval = interval
+        self.lock = ReadWriteLock()
+        self._last_check = time.monotonic()
+        self._check_lock = threading.Lock()
+
+    def poll(self) -> Optional[List[LoadException]]:
+        """
+        Refresh the cookbook if the polling interval has passed. Returns the load errors of the
+        refresh, or None if the folder was not checked.
+        """
+        if time.monotonic() - self._last_check < self.interval:
+            return None
+        if not self._check_lock.acquire(blocking=False):
+            return None  # another thread is already checking
+
+        try:
+            self._last_check = time.monotonic()
+            self.lock.acquire_write()
+            try:
+                _, errors = self.book.refresh()
+            finally:
+                self.lock.release_write()
+            return errors
+        finally:
+            self._check_lock.release()
@@ -12,6 +12,10 @@ setup(
     package_data={
       "cookbook": ['static/*', 'Templates/*', 'localization/*'],
     },
-    install_requires=["flask", "ruamel.yaml"]
+    install_requires=["flask", "ruamel.yaml"],
+    extras_require={
+        "brotli": ["brotli"],
+        "thumbnails": ["pillow"],
+    },
 )
 
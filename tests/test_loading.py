@@ -0,0 +1,22 @@
+from cookbook.cookbook import cookbook
+from cookbook.cookbook.cookbook import Cookbook
+
+
+class TwoPartError(Exception):
+    # pickles, but unpickling calls __init__ with a single argument and fails
+    def __init__(self, name, reason):
+        super().__init__(f"{name}: {reason}")
+
+
+def test_unpicklable_errors_are_parsed_again_in_process(tmp_path, monkeypatch):
+    count = cookbook.PARALLEL_LOAD_THRESHOLD
+    for i in range(count):
+        (tmp_path / f"Recipe {i}.en.recipe").write_text(f"name Recipe {i}\nserves 2\n\n- 100 g flour\nMix.\n")
+
+    def broken(fpath):
+        raise TwoPartError(fpath, "broken")
+
+    monkeypatch.setattr(Cookbook, "load_file", staticmethod(broken))
+    book, errors = Cookbook.load_folder(str(tmp_path), workers=2)
+    assert len(errors) == count
+    assert all(isinstance(error.cause, TwoPartError) for error in errors)
@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+from cookbook.metrics import Registry
+
+
+def files(folder):
+    return sorted(os.listdir(folder))
+
+
+def test_files_of_exited_processes_are_removed(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    stale = tmp_path / f"metrics-{exited.pid}-1.json"
+    stale.write_text(json.dumps({"requests_total": [[[], 5]]}))
+    running = tmp_path / f"metrics-{os.getppid()}-1.json"
+    running.write_text(json.dumps({"requests_total": [[[], 2]]}))
+
+    registry = Registry(str(tmp_path))
+    requests = registry.counter("requests_total", "Requests")
+    requests.inc()
+
+    assert "requests_total 3" in registry.render()
+    assert not stale.exists()
+    assert running.exists()
+
+    registry.close()
+    assert files(tmp_path) == [running.name]
@@ -0,0 +1,38 @@
+import random
+from collections import Counter
+
+from cookbook.cookbook.ranking import CountRanking
+
+
+def check(ranking, expected: Counter):
+    assert sorted(ranking) == sorted(key for key, count in expected.items() if count)
+    counts = [expected[key] for key in ranking]
+    assert counts == sorted(counts, reverse=True)
+    assert all(ranking.positions[key] == i for i, key in enumerate(ranking))
+
+
+def test_ranking_follows_counts():
+    rng = random.Random(0)
+    ranking = CountRanking()
+    expected = Counter()
+    keys = [f"tag{i}" for i in range(20)]
+
+    for _ in range(5000):
+        key = rng.choice(keys)
+        if expected[key] and rng.random() < 0.45:
+            ranking.decrement(key)
+            expected[key] -= 1
+        else:
+            ranking.increment(key)
+            expected[key] += 1
+        check(ranking, expected)
+
+
+def test_last_key_leaves_the_ranking():
+    ranking = CountRanking()
+    ranking.increment("cake")
+    ranking.increment("bread")
+    ranking.increment("bread")
+    ranking.decrement("cake")
+    assert list(ranking) == ["bread"]
+    assert ranking.count("cake") == 0
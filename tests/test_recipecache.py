@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from cookbook.cookbook.cookbook import Cookbook
+from cookbook.cookbook.recipecache import RecipeCache
+
+
+@pytest.fixture
+def recipe_file(tmp_path):
+    path = tmp_path / "Cake.en.recipe"
+    path.write_text("name Cake\nserves 2\ntags cake\n\n- 100 g flour\nMix.\n")
+    return str(path)
+
+
+def set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_file_is_not_read(tmp_path, recipe_file, monkeypatch):
+    cache = RecipeCache(str(tmp_path / "cache"))
+    cache.put(recipe_file, Cookbook.load_file(recipe_file))
+
+    def no_digest(content):
+        raise AssertionError("hashed an unchanged file")
+
+    monkeypatch.setattr(RecipeCache, "digest", staticmethod(no_digest))
+    assert cache.get(recipe_file).metadata.name == "Cake"
+
+
+def test_touched_file_is_matched_by_content(tmp_path, recipe_file):
+    cache = RecipeCache(str(tmp_path / "cache"))
+    cache.put(recipe_file, Cookbook.load_file(recipe_file))
+
+    set_mtime(recipe_file, os.stat(recipe_file).st_mtime_ns + 1_000_000_000)
+    assert cache.get(recipe_file).metadata.name == "Cake"
+
+
+def test_changed_file_misses(tmp_path, recipe_file):
+    cache = RecipeCache(str(tmp_path / "cache"))
+    cache.put(recipe_file, Cookbook.load_file(recipe_file))
+    mtime = os.stat(recipe_file).st_mtime_ns
+
+    with open(recipe_file, "a") as file:
+        file.write("Bake.\n")
+    set_mtime(recipe_file, mtime + 1_000_000_000)
+    assert cache.get(recipe_file) is None
@@ -0,0 +1,70 @@
+import os
+
+from cookbook.cookbook import cookbook
+from cookbook.cookbook.cookbook import Cookbook
+
+
+def write_recipe(folder, name, tags, related=None):
+    lines = [f"name {name}", "serves 2", f"tags {', '.join(tags)}"]
+    if related:
+        lines.append(f"related {related}")
+    lines += ["", "- 100 g flour", "Mix."]
+    path = os.path.join(folder, f"{name}.en.recipe")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    # make sure the change is seen even on file systems with coarse timestamps
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def messages(errors):
+    return [error.args[0] for error in errors]
+
+
+def test_refresh_only_warns_about_changed_recipes(tmp_path):
+    write_recipe(tmp_path, "Cake", ["dessert"])
+    write_recipe(tmp_path, "Pudding", ["desert"], related="Nothing")
+    book, errors = Cookbook.load_folder(str(tmp_path))
+    assert any("'desert'" in message for message in messages(errors))
+    assert any("unknown related recipe nothing" in message for message in messages(errors))
+
+    write_recipe(tmp_path, "Bread", ["baking"])
+    _, errors = book.refresh()
+    assert errors == []
+
+    write_recipe(tmp_path, "Pie", ["desserts"], related="Cakes")
+    _, errors = book.refresh()
+    assert any("'desserts'" in message for message in messages(errors))
+    assert any("Recipe pie references unknown related recipe cakes" in message for message in messages(errors))
+    assert not any("nothing" in message for message in messages(errors))
+
+
+def test_refresh_parses_in_process(tmp_path, monkeypatch):
+    book, _ = Cookbook.load_folder(str(tmp_path), workers=4)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("refresh started a process pool")
+
+    monkeypatch.setattr(cookbook, "ProcessPoolExecutor", no_pool)
+    for i in range(cookbook.PARALLEL_LOAD_THRESHOLD):
+        write_recipe(tmp_path, f"Recipe {i}", ["bulk"])
+    _, errors = book.refresh()
+    assert errors == []
+    assert len(book.by_id) == cookbook.PARALLEL_LOAD_THRESHOLD
+
+
+def test_refresh_keeps_tag_ranking(tmp_path):
+    write_recipe(tmp_path, "Cake", ["dessert", "baking"])
+    write_recipe(tmp_path, "Bread", ["baking"])
+    book, _ = Cookbook.load_folder(str(tmp_path))
+
+    write_recipe(tmp_path, "Pie", ["dessert", "fruit"])
+    os.remove(os.path.join(tmp_path, "Bread.en.recipe"))
+    write_recipe(tmp_path, "Cake", ["fruit"])
+    book.refresh()
+
+    counts = {tag: bits.bit_count() for tag, bits in book.tag_bits_by_language["en"].items()}
+    ranking = book.tag_ranking("en")
+    assert sorted(ranking) == sorted(counts)
+    assert [counts[tag] for tag in ranking] == sorted(counts.values(), reverse=True)
+    assert book.most_common_tags("en", 1) == ["fruit"]
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+from cookbook.main import create_app
+client = create_app().test_client()
+for _ in range(2):  # rendered, then from the page cache
+    response = client.get('/en/search?query=cake&explain')
+    assert response.status_code == 200, response.status_code
+    assert response.mimetype == 'text/plain', response.mimetype
+    assert 'lang=en' in response.headers.get('Set-Cookie', ''), response.headers
+    assert 'Cookie' in response.vary, response.headers
+"""
+
+DUPLICATES_SCRIPT = """
+from cookbook.main import create_app
+client = create_app().test_client()
+searched, cached = (client.get('/en/search?query=cake').get_data(as_text=True) for _ in range(2))
+assert 'Yaml Cake' in searched, searched
+assert cached == searched, cached
+"""
+
+
+def run(script, folder, **config):
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_COOKBOOK_LOCATION=str(folder), FLASK_BASE_URL="http://localhost",
+               **{f"FLASK_{name}": value for name, value in config.items()})
+    env.pop("COOKBOOK_CONFIG", None)
+    env.pop("EXTRA_COOKBOOK_CONFIG", None)
+    return subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_explain_is_sent_like_other_searches(tmp_path):
+    with open(os.path.join(tmp_path, "Cake.en.recipe"), 'w', encoding='utf-8') as file:
+        file.write("name Cake\nserves 2\ntags cake\n\n# Main\n- 100 g flour\nMix.\n")
+
+    result = run(SCRIPT, tmp_path)
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_cached_results_keep_recipes_with_the_same_id(tmp_path):
+    with open(os.path.join(tmp_path, "Cake.en.recipe"), 'w', encoding='utf-8') as file:
+        file.write("name Cake\nserves 2\ntags cake\n\n# Main\n- 100 g flour\nMix.\n")
+    with open(os.path.join(tmp_path, "Cake.en.yml"), 'w', encoding='utf-8') as file:
+        file.write("name: Yaml Cake\nserves: 1\ntags: cake\n")
+
+    result = run(DUPLICATES_SCRIPT, tmp_path, PAGE_CACHE_SIZE="0")
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,18 @@
+import pytest
+
+from cookbook.searchparser import Parser
+
+
+@pytest.mark.parametrize("query", ["\\", "cake \\", "cake\\", "'cake\\", "tag:\\", "x \\\\"])
+def test_trailing_backslash_is_a_literal(query):
+    tokens = Parser(query).tokenize()
+    assert ('word', '') not in tokens
+    assert tokens[-1][1].endswith("\\")
+
+
+@pytest.mark.parametrize("query", ["\\", "cake \\", "tag:dessert \\", "-\\", "a\\ b", "'it\\'s' OR \\"])
+def test_parsed_query_round_trips(query):
+    parsed = Parser(query).parse()
+    reparsed = Parser(str(parsed)).parse()
+    assert str(reparsed) == str(parsed)
+    assert reparsed.key() == parsed.key()
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_recipes(folder, count: int):
+    for i in range(count):
+        with open(os.path.join(folder, f"Dish {i}.en.recipe"), 'w', encoding='utf-8') as file:
+            file.write(f"name Dish {i}\nserves 2\ntags test\n\n# Main\n- 100 g flour\nMix.\n")
+
+
+@pytest.mark.parametrize("get_app", [
+    "from cookbook import app",
+    "from cookbook.main import create_app; app = create_app()",
+])
+def test_startup_with_load_workers(tmp_path, get_app):
+    # parsing in a process pool used to hang forever when the cookbook was loaded during the package's import
+    write_recipes(tmp_path, 100)
+    env = dict(os.environ, PYTHONPATH=ROOT, FLASK_COOKBOOK_LOCATION=str(tmp_path),
+               FLASK_BASE_URL="http://localhost", FLASK_LOAD_WORKERS="4")
+    env.pop("COOKBOOK_CONFIG", None)
+    env.pop("EXTRA_COOKBOOK_CONFIG", None)
+    script = f"{get_app}\nassert app.test_client().get('/en/all').status_code == 200\n"
+
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    assert "Cookbook: 100 recipes loaded" in result.stdout
@@ -0,0 +1,32 @@
+import pytest
+
+from cookbook.cookbook.recipev2 import Ingredient
+from cookbook.cookbook.units import merge_ingredients
+
+
+def totals(*lines, serves=4):
+    ingredients = [Ingredient(serves, name, amount, unit) for amount, unit, name in lines]
+    return [(total.amount, total.unit) for total in merge_ingredients(ingredients, serves, Ingredient)]
+
+
+@pytest.mark.parametrize("lines, expected", [
+    ([(193, "ml", "water"), (253, "l", "water")], (253, "l")),
+    ([(438, "tbsp", "oil"), (319, "ml", "oil")], (6.89, "l")),
+    ([(200, "g", "flour"), (0.5, "kg", "flour")], (700, "g")),
+    ([(600, "g", "flour"), (600, "g", "flour")], (1.2, "kg")),
+    ([(1, "cup", "milk"), (2, "tbsp", "milk")], (270, "ml")),
+    ([(2, "cups", "milk"), (1, "cup", "milk")], (3, "cups")),
+    ([(2, None, "eggs"), (1, "pcs", "eggs")], (3, None)),
+])
+def test_merged_totals_are_readable(lines, expected):
+    assert totals(*lines) == [expected]
+
+
+def test_single_lines_keep_their_unit():
+    assert totals((1500, "g", "sugar")) == [(1500, "g")]
+
+
+def test_per_serving_amount_follows_the_total():
+    ingredients = [Ingredient(4, "oil", 438, "tbsp"), Ingredient(4, "oil", 319, "ml")]
+    total, = merge_ingredients(ingredients, 4, Ingredient)
+    assert total.amount_per_serving * 4 == pytest.approx(total.amount)
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from cookbook.watch import ReadWriteLock
+
+
+def test_writer_is_not_starved_by_arriving_readers():
+    lock = ReadWriteLock()
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            lock.acquire_read()
+            time.sleep(0.005)
+            lock.release_read()
+
+    readers = [threading.Thread(target=reader, daemon=True) for _ in range(8)]
+    for thread in readers:
+        thread.start()
+    time.sleep(0.05)  # let the read sides overlap
+
+    acquired = threading.Event()
+
+    def writer():
+        lock.acquire_write()
+        acquired.set()
+        lock.release_write()
+
+    threading.Thread(target=writer, daemon=True).start()
+    try:
+        assert acquired.wait(timeout=5)
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join(timeout=5)